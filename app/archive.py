@@ -0,0 +1,153 @@
+import statistics
+import time
+
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from app.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Hot/cold order archive
+# archive_batch() moves a batch of old orders and their items into
+# ArchivedOrder / ArchivedOrderItem (see app/models.py) in one
+# transaction: INSERT ... SELECT copies the rows inside the database and
+# DELETE removes them, nothing goes through Python. The orders are
+# deleted with SQL and not with Order.delete(), so their sales stay in
+# the daily rollup.
+
+# find_order() is how a single order is read: the live table first, the
+# archive when it's not there.
+
+ARCHIVE_STATUSES = (Order.StatusChoices.DELIVERED, Order.StatusChoices.CANCELED)
+
+ORDER_COLUMNS = ["order_id", "user_id", "created_at", "status", "total_price"]
+ITEM_COLUMNS = ["id", "order_id", "product_id", "quantity", "unit_price"]
+
+
+def archivable(before, statuses=ARCHIVE_STATUSES):
+    # oldest first, order_status_created_idx finds them
+    return Order.objects.filter(status__in=statuses, created_at__lt=before).order_by(
+        "created_at"
+    )
+
+
+def archive_batch(before, statuses=ARCHIVE_STATUSES, batch_size=1000):
+    """
+    Moves up to batch_size orders created before `before` with one of the
+    `statuses` to the archive. Returns the number of orders moved.
+    """
+    with transaction.atomic():
+        # select_for_update() keeps the orders from changing in the
+        # meantime where the database has row locks (SQLite locks the
+        # whole database at the first write below)
+        ids = list(
+            archivable(before, statuses)
+            .select_for_update()
+            .values_list("order_id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        pk = Order._meta.pk
+        params = [pk.get_db_prep_value(value, connection) for value in ids]
+        placeholders = ", ".join(["%s"] * len(ids))
+        archived_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        order_table = Order._meta.db_table
+        item_table = OrderItem._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {ArchivedOrder._meta.db_table} "
+                f"({', '.join(ORDER_COLUMNS)}, archived_at) "
+                f"SELECT {', '.join(ORDER_COLUMNS)}, %s FROM {order_table} "
+                f"WHERE order_id IN ({placeholders})",
+                [archived_at, *params],
+            )
+            cursor.execute(
+                f"INSERT INTO {ArchivedOrderItem._meta.db_table} "
+                f"({', '.join(ITEM_COLUMNS)}) "
+                f"SELECT {', '.join(ITEM_COLUMNS)} FROM {item_table} "
+                f"WHERE order_id IN ({placeholders})",
+                params,
+            )
+            for table in (item_table, order_table):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE order_id IN ({placeholders})", params
+                )
+    return len(ids)
+
+
+def find_order(order_id):
+    """
+    The order with its items (and their products), from Order or else from
+    the archive. Raises Order.DoesNotExist when it's in neither.
+    """
+    order = Order.objects.for_listing().filter(pk=order_id).first()
+    if order is not None:
+        return order
+    items = ArchivedOrderItem.objects.select_related("product")
+    archived = ArchivedOrder.objects.prefetch_related(models.Prefetch("items", queryset=items))
+    order = archived.filter(pk=order_id).first()
+    if order is None:
+        raise Order.DoesNotExist(f"No order {order_id}.")
+    return order
+
+
+def compact():
+    """
+    Gives the space of the moved rows back and refreshes the statistics.
+    Returns False when VACUUM was left out: it can't run in a transaction.
+    """
+    tables = [Order._meta.db_table, OrderItem._meta.db_table]
+    vacuum = not connection.in_atomic_block
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # VACUUM rewrites the whole file
+            if vacuum:
+                cursor.execute("VACUUM")
+            cursor.execute("ANALYZE")
+        elif connection.vendor == "postgresql":
+            for table in tables:
+                cursor.execute(f"VACUUM ANALYZE {table}" if vacuum else f"ANALYZE {table}")
+    return vacuum
+
+
+def table_bytes(model):
+    """Bytes used by a model's table and its indexes, None if unknown."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [table],
+                )
+            except DatabaseError:
+                # SQLite built without the dbstat table
+                return None
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+        else:
+            return None
+        return cursor.fetchone()[0]
+
+
+def hot_query_timings(repeat=5):
+    """Median ms of the reads that scan the live order tables."""
+    newest = Order.objects.order_by("-created_at", "-order_id")
+    queries = {
+        "count": Order.objects.count,
+        "pending page": lambda: list(
+            newest.filter(status=Order.StatusChoices.PENDING)[:50]
+        ),
+        "listing page": lambda: list(newest.for_listing()[:50]),
+        "item count": OrderItem.objects.count,
+    }
+    timings = {}
+    for name, query in queries.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(runs)
+    return timings
@@ -0,0 +1,117 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from rest_framework.exceptions import APIException
+
+from app import views
+from app.fast_serializers import order_reader, product_reader
+from app.fieldsets import get_fieldset, load_only, sparse_serializer, trim
+from app.filters import filter_orders, filter_products
+from app.models import Order, Product
+from app.pagination import OrderPagination, ProductPagination
+from app.product_cache import aget_product_entry, format_etag
+from app.renderers import renderer_for
+from app.serializers import OrderSerializer, ProductSerializer
+from app.streaming import astream_json_array, wants_stream
+
+
+# Async views
+# https://docs.djangoproject.com/en/5.2/topics/async/
+
+# Under ASGI (backend/asgi.py) every sync view is run through sync_to_async,
+# which hands the request to a worker thread and keeps that thread busy for
+# the whole database round trip. These views are native coroutines that use
+# the async ORM (aget, async for) and the async cache API instead.
+
+# DRF's @api_view doesn't support async functions, so these are plain
+# Django views. They return the same JSON (or MessagePack, from the Accept
+# header) as the views in app/views.py, no browsable API, and are switched
+# on per route with ASYNC_API_ROUTES in backend/settings.py.
+
+
+def _render(request, data, status=200, renderer=None):
+    renderer = renderer or renderer_for(request)
+    return HttpResponse(
+        renderer.render(data), status=status, content_type=renderer.media_type
+    )
+
+
+def async_api_view(view):
+    # turn the errors DRF would handle into the same JSON error responses
+    @require_GET
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404 as exc:
+            return _render(request, {"detail": str(exc) or "Not found."}, status=404)
+        except APIException as exc:
+            return _render(request, {"detail": exc.detail}, status=exc.status_code)
+
+    return wrapper
+
+
+@async_api_view
+async def product_list(request):
+    serializer, fieldset = sparse_serializer(request, ProductSerializer)
+    product = filter_products(Product.objects.with_in_stock(), request)
+    product = load_only(product, serializer, fieldset)
+    if wants_stream(request):
+        product = product.order_by(*ProductPagination.ordering)
+        return astream_json_array(product, product_reader.restricted(fieldset))
+
+    paginator = ProductPagination()
+    serializer.instance = await paginator.apaginate_queryset(product, request)
+    return _render(request, paginator.get_paginated_data(serializer.data))
+
+
+@async_api_view
+async def product_detail(request, pk):
+    fieldset = get_fieldset(request, ProductSerializer())
+    entry = await aget_product_entry(pk)
+    renderer = renderer_for(request)
+    etag = format_etag(entry, renderer)
+    response = _render(request, trim(entry["data"], fieldset), renderer=renderer)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    patch_vary_headers(response, ["Accept"])
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=entry["last_modified"],
+        response=response,
+    )
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def order_list(request):
+    if request.method == "POST":
+        # placing an order goes through the sync DRF view: authentication,
+        # CSRF for session users and the stock reservation transaction
+        return await sync_to_async(views.order_list)(request)
+    return await _order_list(request)
+
+
+@async_api_view
+async def _order_list(request):
+    serializer, fieldset = sparse_serializer(request, OrderSerializer)
+    orders, ordering = filter_orders(
+        Order.objects.for_listing(items=views.item_columns(serializer, fieldset)),
+        request,
+    )
+    if wants_stream(request):
+        orders = orders.order_by(*ordering)
+        return astream_json_array(orders, order_reader.restricted(fieldset))
+
+    paginator = OrderPagination(ordering)
+    orders = load_only(orders, serializer, fieldset, extra=paginator.columns())
+    # the items are prefetched while the page is fetched, so serializing
+    # them doesn't touch the database
+    serializer.instance = await paginator.apaginate_queryset(orders, request)
+    return _render(request, paginator.get_paginated_data(serializer.data))
@@ -0,0 +1,213 @@
+import math
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import Order
+from app.product_cache import get_cache
+
+
+# Endpoint benchmark suite
+# Seeds the database with populate_db at one or more scales and measures
+# every API route through the Django test client:
+
+# latency p50/p95/p99 (ms), throughput (requests/sec), the largest number
+# of SQL queries a single request ran and the peak memory Python allocated
+# during one request (KiB, measured in a separate pass, tracemalloc slows
+# everything down).
+
+# Used by the bench_api management command and by APIBenchmarkTests in
+# app/tests.py, which fail when a result is over its budget.
+
+SCALES = {
+    "tiny": {"products": 50, "users": 5, "orders": 200},
+    "small": {"products": 1_000, "users": 100, "orders": 10_000},
+    "medium": {"products": 10_000, "users": 1_000, "orders": 100_000},
+    "large": {"products": 100_000, "users": 10_000, "orders": 1_000_000},
+}
+
+# the most a result may be; a missing key isn't checked
+BUDGETS = {
+    "products": {"queries": 1, "p95_ms": 250},
+    "product_detail": {"queries": 1, "p95_ms": 100},
+    "orders": {"queries": 2, "p95_ms": 500},
+}
+
+
+def endpoint_urls():
+    return {
+        "products": reverse("products"),
+        "product_detail": reverse("product_detail", args=[1]),
+        "orders": reverse("orders"),
+    }
+
+
+def seed(scale, seed=42):
+    call_command("flush", interactive=False, verbosity=0)
+    options = [f"--{key}={value}" for key, value in SCALES[scale].items()]
+    call_command("populate_db", *options, f"--seed={seed}", stdout=StringIO())
+
+
+def percentile(timings, percent):
+    # nearest-rank percentile of a sorted list
+    index = max(0, math.ceil(percent / 100 * len(timings)) - 1)
+    return timings[index]
+
+
+def measure(client, url, requests):
+    get_cache().clear()
+    timings = []
+    queries = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            request_start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - request_start) * 1000)
+        if response.status_code != 200:
+            raise AssertionError(f"GET {url} returned {response.status_code}")
+        queries = max(queries, len(captured))
+    elapsed = time.perf_counter() - start
+
+    get_cache().clear()
+    tracemalloc.start()
+    client.get(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "requests": requests,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "queries": queries,
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def over_budget(results, budgets=BUDGETS):
+    """Returns a message for every result above its budget."""
+    problems = []
+    for scale, endpoints in results.items():
+        for endpoint, result in endpoints.items():
+            for key, limit in budgets.get(endpoint, {}).items():
+                if result[key] > limit:
+                    problems.append(
+                        f"{scale}/{endpoint}: {key} is {result[key]}, budget {limit}"
+                    )
+    return problems
+
+
+def run(scales, requests=100, client=None):
+    """Seeds every scale in turn and returns {scale: {endpoint: result}}."""
+    client = client or Client()
+    results = {}
+    for scale in scales:
+        seed(scale)
+        results[scale] = {
+            endpoint: measure(client, url, requests)
+            for endpoint, url in endpoint_urls().items()
+        }
+    return results
+
+
+# Checkout under contention
+# Many buyers racing for the last units of one product. Used by the
+# stress_orders management command and by OrderCreateStressTests.
+
+
+def checkout_stress(product, users, buyers, quantity=1, threads=32):
+    """
+    Lets `buyers` concurrent buyers (spread over `users`) try to order
+    `quantity` of the same product through POST orders/, and checks that
+    the stock was never oversold.
+    """
+    url = reverse("orders")
+    stocks_before = product.stocks
+    orders_before = Order.objects.count()
+
+    def buy(i):
+        client = APIClient()
+        client.force_authenticate(users[i % len(users)])
+        try:
+            response = client.post(
+                url,
+                {"items": [{"product": product.pk, "quantity": quantity}]},
+                format="json",
+            )
+            return response.status_code
+        finally:
+            # every thread has its own database connection
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        statuses = list(pool.map(buy, range(buyers)))
+    elapsed = time.perf_counter() - start
+
+    product.refresh_from_db()
+    created = statuses.count(201)
+    result = {
+        "buyers": buyers,
+        "created": created,
+        "out_of_stock": statuses.count(409),
+        "failed": len(statuses) - created - statuses.count(409),
+        "orders_per_sec": round(created / elapsed, 1),
+        "stocks_before": stocks_before,
+        "stocks_after": product.stocks,
+    }
+    sold = Order.objects.count() - orders_before
+    if sold != created or product.stocks != stocks_before - created * quantity:
+        raise AssertionError(f"Stock and orders don't add up: {result}")
+    return result
+
+
+# Sparse fieldsets
+# What ?fields= / ?exclude= save (see app/fieldsets.py): the size of the
+# response and the bytes of column values the database handed to Django.
+# Used by the bench_fieldsets management command.
+
+
+def value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, memoryview)):
+        return len(value)
+    # integers, floats, dates: SQLite stores them in 8 bytes or less
+    return 8
+
+
+def read_cost(client, url):
+    """Response and database bytes of one GET request."""
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    if response.status_code != 200:
+        raise AssertionError(f"GET {url} returned {response.status_code}")
+
+    # the captured SQL has its parameters filled in, running it again
+    # returns the same rows
+    db_bytes = 0
+    with connection.cursor() as cursor:
+        for query in captured:
+            if not query["sql"].lstrip().upper().startswith("SELECT"):
+                continue
+            cursor.execute(query["sql"])
+            db_bytes += sum(value_size(value) for row in cursor.fetchall() for value in row)
+    return {
+        "queries": len(captured),
+        "db_bytes": db_bytes,
+        "response_bytes": len(response.content),
+    }
@@ -0,0 +1,97 @@
+import csv
+import zlib
+from io import StringIO
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.fast_serializers import order_item_reader, order_reader
+from app.models import Order
+
+# Order export for the data warehouse
+# Used by the export_orders management command and orders/export/.
+
+# The orders are read like the ?stream=1 listing: a server-side cursor
+# (.iterator()) hands the rows over in chunks, the items of a chunk are
+# fetched with one query, and every chunk is written out before the next
+# one is read. Memory stays flat however many orders there are.
+
+#   ndjson, nested   one order per line with its "items" list
+#   ndjson, flat     one line per item, the order's fields repeated
+#   csv              always flat, one row per item, with a header row
+
+# An order without items still gets one flat row, with empty item fields.
+
+FORMATS = ("ndjson", "csv")
+LAYOUTS = ("nested", "flat")
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = [name for name, _, _ in order_reader.fields if name != "items"]
+ITEM_COLUMNS = [name for name, _, _ in order_item_reader.fields]
+FLAT_COLUMNS = ORDER_COLUMNS + ITEM_COLUMNS
+
+
+def export_queryset(since=None):
+    # oldest first, so an incremental export (since=) picks up where the
+    # last one stopped; order_id keeps the order stable within a timestamp
+    orders = Order.objects.order_by("created_at", "order_id")
+    if since is not None:
+        orders = orders.filter(created_at__gte=since)
+    return orders
+
+
+def flat_rows(order):
+    base = {name: order[name] for name in ORDER_COLUMNS}
+    if not order["items"]:
+        yield base
+    for item in order["items"]:
+        yield {**base, **item}
+
+
+def _ndjson(chunk, layout):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    if layout == "flat":
+        chunk = (row for order in chunk for row in flat_rows(order))
+    return "".join(encoder.encode(data) + "\n" for data in chunk)
+
+
+def _csv(chunk, header):
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, FLAT_COLUMNS, lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(row for order in chunk for row in flat_rows(order))
+    return buffer.getvalue()
+
+
+def export_chunks(orders, format="ndjson", layout="nested", chunk_size=None, stats=None):
+    """
+    Yields the export of `orders` as bytes, one piece per chunk of orders.
+    stats["orders"] counts the orders written so far.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    stats = stats if stats is not None else {}
+    stats.setdefault("orders", 0)
+    if format == "csv":
+        # a header even for an empty export
+        yield _csv([], header=True).encode()
+    for chunk in order_reader.read_chunks(orders, chunk_size):
+        stats["orders"] += len(chunk)
+        if format == "csv":
+            yield _csv(chunk, header=False).encode()
+        else:
+            yield _ndjson(chunk, layout).encode()
+
+
+def gzip_chunks(chunks):
+    # compresses as the chunks go by, the whole file is never in memory
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+def file_name(format, compress):
+    return f"orders.{format}" + (".gz" if compress else "")
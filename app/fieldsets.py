@@ -0,0 +1,181 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from app.pagination import query_params
+
+
+# Sparse fieldsets
+#   ?fields=id,name,price                 only these fields
+#   ?exclude=description                  every field but these
+#   ?fields=order_id,items.quantity       nested fields with a dot
+
+# The fields are removed from the serializer, and the query only loads
+# the columns the remaining fields need (QuerySet.only()), so a listing
+# without descriptions doesn't read the descriptions from the database
+# either. A serializer field that isn't a plain column declares the
+# columns it needs in Meta.column_dependencies, e.g. a @property computed
+# from two columns, or () for an annotation.
+
+
+class FieldSet:
+    def __init__(self, include=None, exclude=None):
+        # {"name": {}, "items": {"quantity": {}}}, an empty dict is the
+        # whole field; include=None means every field
+        self.include = include
+        self.exclude = exclude or {}
+
+    @classmethod
+    def from_request(cls, request):
+        params = query_params(request)
+        return cls(
+            include=cls.parse(params["fields"]) if params.get("fields") else None,
+            exclude=cls.parse(params.get("exclude", "")),
+        )
+
+    @staticmethod
+    def parse(value):
+        tree = {}
+        for path in value.split(","):
+            node = tree
+            for name in filter(None, path.strip().split(".")):
+                node = node.setdefault(name, {})
+        return tree
+
+    def __bool__(self):
+        return self.include is not None or bool(self.exclude)
+
+    def keeps(self, name):
+        if self.include is not None and name not in self.include:
+            return False
+        # "items" excludes the field, "items.quantity" only a nested field
+        return not (name in self.exclude and not self.exclude[name])
+
+    def nested(self, name):
+        include = self.include.get(name) if self.include is not None else None
+        return FieldSet(include=include or None, exclude=self.exclude.get(name))
+
+    def unknown(self, fields, prefix=""):
+        """The requested names that aren't fields of the serializer."""
+        names = {*(self.include or ()), *self.exclude}
+        missing = []
+        for name in names:
+            if name not in fields:
+                missing.append(prefix + name)
+                continue
+            child = nested_serializer(fields[name])
+            nested = self.nested(name)
+            if nested and child is None:
+                subfields = {*(nested.include or ()), *nested.exclude}
+                missing += [f"{prefix}{name}.{sub}" for sub in subfields]
+            elif nested:
+                missing += nested.unknown(child.fields, prefix=f"{prefix}{name}.")
+        return sorted(missing)
+
+
+def nested_serializer(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def get_fieldset(request, serializer):
+    """
+    The FieldSet of the request; raises ValidationError (400) for fields the
+    serializer doesn't have.
+    """
+    fieldset = FieldSet.from_request(request)
+    if fieldset:
+        unknown = fieldset.unknown(serializer.fields)
+        if unknown:
+            raise ValidationError({"fields": [f"Unknown fields: {', '.join(unknown)}."]})
+    return fieldset
+
+
+def sparse_serializer(request, serializer_class, **kwargs):
+    """
+    serializer_class(many=True, **kwargs) with only the fields the request
+    asked for, and the FieldSet. Set .instance before reading .data.
+    """
+    serializer = serializer_class(many=True, **kwargs)
+    fieldset = get_fieldset(request, serializer.child)
+    restrict(serializer, fieldset)
+    return serializer, fieldset
+
+
+def load_only(queryset, serializer, fieldset, extra=()):
+    """
+    queryset.only() the columns the serializer reads, and `extra` (e.g. the
+    ordering of the pagination).
+    """
+    if not fieldset:
+        return queryset
+    needed = columns(serializer, queryset.model)
+    if needed is None:
+        return queryset
+    # only join the relations that are still read (product__name), a
+    # select_related() of a deferred foreign key is an error
+    related = {name.rsplit("__", 1)[0] for name in needed if "__" in name}
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*needed, *extra)
+
+
+def restrict(serializer, fieldset):
+    """Removes the fields that weren't asked for from a serializer."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not fieldset:
+        return serializer
+    fields = serializer.fields
+    for name in list(fields):
+        if not fieldset.keeps(name):
+            del fields[name]
+        elif child := nested_serializer(fields[name]):
+            restrict(child, fieldset.nested(name))
+    return serializer
+
+
+def columns(serializer, model):
+    """
+    The model fields (for only()) a serializer with restrict()ed fields
+    reads, nested serializers left out. None when some field's columns
+    aren't known, then everything has to be loaded.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    dependencies = getattr(getattr(serializer, "Meta", None), "column_dependencies", {})
+    needed = []
+    for name, field in serializer.fields.items():
+        if nested_serializer(field) is not None:
+            continue
+        if name in dependencies:
+            needed += dependencies[name]
+            continue
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except (FieldDoesNotExist, IndexError):
+            return None
+        if not model_field.concrete:
+            return None
+        path = field.source_attrs
+        if model_field.is_relation and len(path) > 1:
+            # product.name -> product__name, the related row is joined in
+            needed.append("__".join(path))
+        else:
+            needed.append(model_field.name)
+    return needed
+
+
+def trim(data, fieldset):
+    """restrict() for data that is already serialized (cached)."""
+    if not fieldset:
+        return data
+    if isinstance(data, list):
+        return [trim(item, fieldset) for item in data]
+    return {
+        name: trim(value, fieldset.nested(name)) if isinstance(value, (dict, list)) else value
+        for name, value in data.items()
+        if fieldset.keeps(name)
+    }
@@ -0,0 +1,51 @@
+from app.pagination import query_params
+from app.serializers import OrderFilterSerializer, ProductFilterSerializer
+
+
+# Filtering and ordering of orders/
+#   ?user=<id>&status=Pending&created_after=2025-01-01&created_before=...
+#   &ordering=-created_at (created_at, -created_at, total_price, -total_price)
+
+# Every filter is a WHERE clause backed by one of the indexes in
+# Order.Meta.indexes, so the database never scans the whole table. The
+# ordering is completed with order_id, which keeps it unique for the keyset
+# pagination.
+
+
+def filter_products(queryset, request):
+    """
+    ?in_stock=true / false. In stock is decided by the database, backed by
+    the partial index product_in_stock_idx (see Product.Meta.indexes).
+    """
+    serializer = ProductFilterSerializer(data=query_params(request))
+    serializer.is_valid(raise_exception=True)
+    in_stock = serializer.validated_data["in_stock"]
+
+    if in_stock is True:
+        queryset = queryset.in_stock()
+    elif in_stock is False:
+        queryset = queryset.out_of_stock()
+    return queryset
+
+
+def filter_orders(queryset, request):
+    """
+    Returns the filtered queryset and its ordering. Raises
+    ValidationError (400) for invalid parameters.
+    """
+    serializer = OrderFilterSerializer(data=query_params(request))
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    if "user" in params:
+        queryset = queryset.filter(user_id=params["user"])
+    if "status" in params:
+        queryset = queryset.filter(status=params["status"])
+    if "created_after" in params:
+        queryset = queryset.filter(created_at__gte=params["created_after"])
+    if "created_before" in params:
+        queryset = queryset.filter(created_at__lt=params["created_before"])
+
+    field = params["ordering"]
+    tiebreaker = "-order_id" if field.startswith("-") else "order_id"
+    return queryset, (field, tiebreaker)
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.archive import (
+    ARCHIVE_STATUSES,
+    archivable,
+    archive_batch,
+    compact,
+    hot_query_timings,
+    table_bytes,
+)
+from app.models import Order, OrderItem
+
+
+def megabytes(size):
+    return "?" if size is None else f"{size / 1024 / 1024:,.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves old delivered and canceled orders to the archive tables, in "
+        "batches, then compacts the database and reports the difference"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=180, help="age in days (default 180)"
+        )
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=Order.StatusChoices.values,
+            help=f"repeat for several (default: {', '.join(ARCHIVE_STATUSES)})",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--no-vacuum", action="store_true", help="skip VACUUM / ANALYZE"
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["older_than"])
+        statuses = options["status"] or ARCHIVE_STATUSES
+        self.stdout.write(
+            f"{archivable(before, statuses).count():,} orders created before "
+            f"{before:%Y-%m-%d} to archive"
+        )
+
+        sizes = {model: table_bytes(model) for model in (Order, OrderItem)}
+        timings = hot_query_timings()
+
+        # one transaction per batch: the tables are only locked briefly and
+        # an interrupted run keeps what it has moved
+        moved = 0
+        start = time.perf_counter()
+        while batch := archive_batch(before, statuses, options["batch_size"]):
+            moved += batch
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{moved:,} orders archived")
+        elapsed = time.perf_counter() - start
+        rate = moved / elapsed if elapsed else 0
+        self.stdout.write(f"Archived {moved:,} orders in {elapsed:.1f}s ({rate:,.0f}/sec)")
+
+        if not options["no_vacuum"]:
+            start = time.perf_counter()
+            steps = "VACUUM / ANALYZE" if compact() else "ANALYZE (no VACUUM in a transaction)"
+            self.stdout.write(f"{steps} in {time.perf_counter() - start:.1f}s")
+
+        for model, size in sizes.items():
+            self.stdout.write(
+                f"{model._meta.db_table}: {megabytes(size)} -> {megabytes(table_bytes(model))}"
+            )
+        after = hot_query_timings()
+        for name, ms in timings.items():
+            self.stdout.write(f"{name}: {ms:.2f} ms -> {after[name]:.2f} ms")
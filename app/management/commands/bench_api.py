@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from app import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks products/, product/<pk>/ and orders/ on a throwaway test "
+        "database seeded at the given scales and fails when a budget is exceeded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            nargs="+",
+            choices=list(benchmarks.SCALES),
+            default=["tiny", "small"],
+        )
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--output", help="write the results to this JSON file")
+        parser.add_argument(
+            "--budgets",
+            help="JSON file with {endpoint: {metric: limit}} replacing the defaults",
+        )
+
+    def handle(self, *args, **options):
+        budgets = benchmarks.BUDGETS
+        if options["budgets"]:
+            with open(options["budgets"]) as f:
+                budgets = json.load(f)
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                results = benchmarks.run(options["scales"], options["requests"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        for scale, endpoints in results.items():
+            for endpoint, r in endpoints.items():
+                self.stdout.write(
+                    f"{scale:<7} {endpoint:<15} p50 {r['p50_ms']:8.2f} ms  "
+                    f"p95 {r['p95_ms']:8.2f} ms  p99 {r['p99_ms']:8.2f} ms  "
+                    f"{r['throughput_rps']:8.1f} req/s  {r['queries']} queries  "
+                    f"{r['peak_memory_kib']:9.1f} KiB"
+                )
+
+        problems = benchmarks.over_budget(results, budgets)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({"results": results, "over_budget": problems}, f, indent=2)
+
+        if problems:
+            raise CommandError("Over budget:\n" + "\n".join(problems))
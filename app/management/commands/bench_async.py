@@ -0,0 +1,69 @@
+import asyncio
+import statistics
+import time
+from types import ModuleType
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+
+from app.models import Product
+from app.urls import API_ROUTES, build_urlpatterns
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test of the API through the ASGI handler: requests/sec of the "
+        "sync DRF views versus the native async views at a given concurrency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        product = Product.objects.order_by("id").first()
+        if product is None:
+            self.stderr.write("No products, run populate_db first.")
+            return
+
+        urls = {
+            "products": "/products/",
+            "product_detail": f"/product/{product.pk}/",
+            "orders": "/orders/",
+        }
+        for name, url in urls.items():
+            for mode in ("sync", "async"):
+                async_routes = [r[1] for r in API_ROUTES] if mode == "async" else []
+                urlconf = ModuleType(f"{mode}_urls")
+                urlconf.urlpatterns = build_urlpatterns(async_routes)
+                with override_settings(
+                    ROOT_URLCONF=urlconf, ALLOWED_HOSTS=["testserver"]
+                ):
+                    rate, p50, p99 = asyncio.run(self.load(url, options))
+                self.stdout.write(
+                    f"{name:<15} {mode:<5}: {rate:8.1f} req/s, "
+                    f"p50 {p50:7.2f} ms, p99 {p99:7.2f} ms"
+                )
+
+    async def load(self, url, options):
+        client = AsyncClient()
+        total = options["requests"]
+        concurrency = options["concurrency"]
+        latencies = []
+
+        async def worker(count):
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.status_code
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(worker(total // concurrency) for _ in range(concurrency))
+        )
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        return len(latencies) / elapsed, statistics.median(latencies), p99
@@ -0,0 +1,74 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    teardown_databases,
+)
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import Product, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Posts one batch of generated orders to orders/bulk/ on a throwaway "
+        "test database and reports orders/sec and the number of queries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=10_000)
+        parser.add_argument("--products", type=int, default=1_000)
+        parser.add_argument("--lines", type=int, default=3, help="lines per order")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                partner = User.objects.create_user(username="partner")
+                products = Product.objects.bulk_create(
+                    Product(
+                        name=f"Product {i}",
+                        description="",
+                        price=Decimal("9.99"),
+                        stocks=1_000_000,
+                    )
+                    for i in range(options["products"])
+                )
+                product_ids = [product.pk for product in products]
+                payload = [
+                    {
+                        "items": [
+                            {"product": rng.choice(product_ids), "quantity": rng.randint(1, 3)}
+                            for _ in range(options["lines"])
+                        ]
+                    }
+                    for _ in range(options["orders"])
+                ]
+
+                client = APIClient()
+                client.force_authenticate(partner)
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.post(reverse("orders_bulk"), payload, format="json")
+                elapsed = time.perf_counter() - start
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if response.status_code != 200:
+            self.stderr.write(f"orders/bulk/ returned {response.status_code}")
+            return
+        body = response.json()
+        self.stdout.write(
+            f"{body['created']:,} created, {body['rejected']:,} rejected in "
+            f"{elapsed:.2f}s ({len(payload) / elapsed:,.0f} orders/s), "
+            f"{len(queries)} queries"
+        )
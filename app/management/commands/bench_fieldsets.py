@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+
+from app.benchmarks import read_cost
+from app.product_cache import get_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the response size and the bytes read from the database "
+        "with and without ?fields= / ?exclude=, on a throwaway test database "
+        "seeded with populate_db"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument("--orders", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            call_command(
+                "populate_db",
+                f"--products={options['products']}",
+                "--users=100",
+                f"--orders={options['orders']}",
+                stdout=StringIO(),
+            )
+            products = reverse("products")
+            orders = reverse("orders")
+            detail = reverse("product_detail", args=[1])
+            cases = [
+                ("products", products),
+                ("products -description", f"{products}?exclude=description"),
+                ("products id,name,price", f"{products}?fields=id,name,price"),
+                ("orders", orders),
+                ("orders -items", f"{orders}?exclude=items"),
+                ("orders items.quantity", f"{orders}?fields=order_id,items.quantity"),
+                ("product detail", detail),
+                ("product detail name", f"{detail}?fields=name"),
+            ]
+            client = Client()
+            self.stdout.write(
+                f"{'':<24} {'queries':>8} {'db bytes':>10} {'response bytes':>15}"
+            )
+            for label, url in cases:
+                get_cache().clear()
+                with override_settings(ALLOWED_HOSTS=["testserver"]):
+                    cost = read_cost(client, url)
+                self.stdout.write(
+                    f"{label:<24} {cost['queries']:>8} {cost['db_bytes']:>10,} "
+                    f"{cost['response_bytes']:>15,}"
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from app.models import Order, Product
+from app.pagination import OrderPagination, ProductPagination
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the latency of the first and deep pages of products/ and "
+        "orders/ (keyset pagination) with the equivalent OFFSET query"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, nargs="+", default=[1, 10_000])
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        client = Client(SERVER_NAME="localhost")
+        endpoints = [
+            ("products", Product.objects.all(), ProductPagination()),
+            ("orders", Order.objects.for_listing(), OrderPagination()),
+        ]
+        for url_name, queryset, paginator in endpoints:
+            rows = queryset.count()
+            for page in options["pages"]:
+                self.bench_page(
+                    client, url_name, queryset, paginator, rows, page, options
+                )
+
+    def bench_page(self, client, url_name, queryset, paginator, rows, page, options):
+        page_size = options["page_size"]
+        offset = (page - 1) * page_size
+        if offset >= rows:
+            self.stdout.write(
+                f"{url_name:<9} page {page:>7}: skipped, only {rows} rows"
+            )
+            return
+
+        ordered = queryset.order_by(*paginator.ordering)
+        params = {"page_size": page_size}
+        if offset:
+            # position of the last row of the previous page
+            fields = [paginator.field_name(field) for field in paginator.ordering]
+            position = ordered.values_list(*fields)[offset - 1]
+            params["cursor"] = paginator.encode_cursor(position, reverse=False)
+
+        url = reverse(url_name)
+        keyset = self.timeit(lambda: client.get(url, params), options["repeat"])
+        plain_offset = self.timeit(
+            lambda: list(ordered[offset:offset + page_size]), options["repeat"]
+        )
+        self.stdout.write(
+            f"{url_name:<9} page {page:>7}: keyset request {keyset:8.2f} ms, "
+            f"OFFSET query {plain_offset:8.2f} ms"
+        )
+
+    @staticmethod
+    def timeit(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,72 @@
+import gzip
+import statistics
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.renderers import JSONRenderer
+
+from app.models import Order, Product
+from app.renderers import FastJSONRenderer, MessagePackRenderer
+from app.serializers import OrderSerializer, ProductSerializer
+
+RENDERERS = {
+    "json (drf)": JSONRenderer,
+    "json (orjson)": FastJSONRenderer,
+    "msgpack": MessagePackRenderer,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares render time and payload size of the API formats for pages "
+        "of products and orders, on a throwaway test database seeded with "
+        "populate_db"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[50, 1000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        largest = max(options["sizes"])
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            call_command(
+                "populate_db",
+                f"--products={largest}",
+                "--users=10",
+                f"--orders={largest}",
+                stdout=StringIO(),
+            )
+            products = Product.objects.with_in_stock().order_by("id")
+            orders = Order.objects.for_listing().order_by("-created_at", "-order_id")
+            self.stdout.write(
+                f"{'':<16} {'format':<14} {'render ms':>10} {'bytes':>10} {'gzip':>9}"
+            )
+            for size in options["sizes"]:
+                # the serializers run once, only the rendering is timed
+                pages = {
+                    f"{size} products": ProductSerializer(products[:size], many=True).data,
+                    f"{size} orders": OrderSerializer(orders[:size], many=True).data,
+                }
+                for label, data in pages.items():
+                    for name, renderer_class in RENDERERS.items():
+                        ms, body = self.measure(options["repeat"], renderer_class(), data)
+                        self.stdout.write(
+                            f"{label:<16} {name:<14} {ms:>10.2f} {len(body):>10,} "
+                            f"{len(gzip.compress(body)):>9,}"
+                        )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    @staticmethod
+    def measure(repeat, renderer, data):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = renderer.render(data)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), body
@@ -0,0 +1,83 @@
+import statistics
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.test.utils import setup_databases, teardown_databases
+
+from app import search
+from app.models import Product
+
+PAGE_SIZE = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the FTS5 product search with name/description__icontains "
+        "on a throwaway test database seeded with populate_db"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search needs SQLite (FTS5).")
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            start = time.perf_counter()
+            call_command(
+                "populate_db",
+                f"--products={options['products']}",
+                "--users=0",
+                "--orders=0",
+                stdout=StringIO(),
+            )
+            self.stdout.write(
+                f"{options['products']:,} products (indexed by the triggers) "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+            Product.objects.create(
+                name="Espresso Tamper", description="Stainless steel.", price=25, stocks=1
+            )
+            # icontains stops at the first PAGE_SIZE matches in id order, so
+            # it's fast for words that are everywhere (unranked, though) and
+            # reads the whole table for rare ones
+            queries = {
+                "common word": "dolor",
+                "prefix": "volup",
+                "rare words": "espresso tamp",
+                "no match": "teapot",
+            }
+            self.stdout.write(f"{'':<12} {'fts5 ms':>10} {'icontains ms':>14} {'hits':>8}")
+            for label, q in queries.items():
+                fts, hits = self.measure(options["repeat"], self.fts, q)
+                like, _ = self.measure(options["repeat"], self.icontains, q)
+                self.stdout.write(f"{label:<12} {fts:>10.2f} {like:>14.2f} {hits:>8}")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def measure(self, repeat, func, q):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            page = func(q)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), len(page)
+
+    def fts(self, q):
+        # the first page of products/search/
+        return search.search_products(search.match_expression(q), PAGE_SIZE)
+
+    def icontains(self, q):
+        # the same words, with the best we can do without an index
+        product = Product.objects.all()
+        for word in search.search_words(q):
+            product = product.filter(
+                Q(name__icontains=word) | Q(description__icontains=word)
+            )
+        return list(product.order_by("id")[:PAGE_SIZE])
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.fast_serializers import order_reader, product_reader
+from app.models import Order, Product
+from app.serializers import OrderSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares objects/sec of the ModelSerializer path and the FastReader "
+        "path for products and orders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        cases = [
+            ("products", Product.objects.order_by("id"), ProductSerializer, product_reader),
+            (
+                "orders",
+                Order.objects.for_listing().order_by("-created_at", "-order_id"),
+                OrderSerializer,
+                order_reader,
+            ),
+        ]
+        chunk_size = options["chunk_size"]
+        for label, queryset, serializer_class, reader in cases:
+            rows = queryset.count()
+            for size in options["sizes"]:
+                if size > rows:
+                    self.stdout.write(f"{label:<9} {size:>9}: skipped, only {rows} rows")
+                    continue
+                sliced = queryset[:size]
+
+                def serializer_path():
+                    # same chunked iteration, so both paths hold one chunk
+                    # of instances at a time
+                    count = 0
+                    chunk = []
+                    for obj in sliced.iterator(chunk_size=chunk_size):
+                        chunk.append(obj)
+                        if len(chunk) == chunk_size:
+                            count += len(serializer_class(chunk, many=True).data)
+                            chunk = []
+                    return count + len(serializer_class(chunk, many=True).data)
+
+                def fast_path():
+                    return sum(len(c) for c in reader.read_chunks(sliced, chunk_size))
+
+                slow = self.rate(serializer_path)
+                fast = self.rate(fast_path)
+                self.stdout.write(
+                    f"{label:<9} {size:>9}: serializer {slow:>10,.0f} obj/s, "
+                    f"fast read {fast:>10,.0f} obj/s ({fast / slow:.1f}x)"
+                )
+
+    @staticmethod
+    def rate(func):
+        start = time.perf_counter()
+        count = func()
+        return count / (time.perf_counter() - start)
@@ -0,0 +1,149 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.sqlite import pragma_statements
+
+# the columns of the app tables the workload uses
+SCHEMA = [
+    """CREATE TABLE app_product (
+        id integer PRIMARY KEY AUTOINCREMENT,
+        name varchar(200) NOT NULL,
+        description text NOT NULL,
+        price decimal NOT NULL,
+        stocks integer unsigned NOT NULL
+    )""",
+    """CREATE TABLE app_order (
+        order_id char(32) PRIMARY KEY,
+        user_id bigint NOT NULL,
+        created_at datetime NOT NULL,
+        status varchar(10) NOT NULL,
+        total_price decimal NOT NULL
+    )""",
+    "CREATE INDEX order_created_at_idx ON app_order (created_at, order_id)",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mixed read/write concurrency benchmark on a scratch SQLite file: "
+        "SQLite's defaults with a new connection per operation versus "
+        "SQLITE_PRAGMAS with persistent connections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--rows", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        profiles = [
+            ("default", {}, False),
+            ("tuned", settings.SQLITE_PRAGMAS, True),
+        ]
+        for name, pragmas, persistent in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "bench.sqlite3")
+                self.create(path, pragmas, options["rows"])
+                reads, writes, errors = self.run(path, pragmas, persistent, options)
+            seconds = options["seconds"]
+            self.stdout.write(
+                f"{name:<8} reads {reads / seconds:10,.0f}/s  "
+                f"writes {writes / seconds:8,.0f}/s  locked errors {errors}"
+            )
+
+    def connect(self, path, pragmas):
+        # autocommit, transactions are started explicitly
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        for statement in pragma_statements(pragmas):
+            conn.execute(statement)
+        return conn
+
+    def create(self, path, pragmas, rows):
+        conn = self.connect(path, pragmas)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO app_product (name, description, price, stocks) "
+            "VALUES (?, ?, ?, ?)",
+            ((f"Product {i}", "x" * 200, "9.99", 100) for i in range(rows)),
+        )
+        conn.executemany(
+            "INSERT INTO app_order VALUES (?, 1, datetime('now', ?), 'Pending', 9.99)",
+            ((uuid.uuid4().hex, f"-{i} minutes") for i in range(rows)),
+        )
+        conn.execute("COMMIT")
+        conn.close()
+
+    def run(self, path, pragmas, persistent, options):
+        stop = time.perf_counter() + options["seconds"]
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        rows = options["rows"]
+
+        def operation(conn, write, rng):
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT INTO app_order VALUES (?, 1, datetime('now'), 'Pending', 9.99)",
+                    (uuid.uuid4().hex,),
+                )
+                conn.execute(
+                    "UPDATE app_product SET stocks = stocks - 1 WHERE id = ?",
+                    (rng.randint(1, rows),),
+                )
+                conn.execute("COMMIT")
+            else:
+                conn.execute(
+                    "SELECT * FROM app_product WHERE id = ?", (rng.randint(1, rows),)
+                ).fetchall()
+                conn.execute(
+                    "SELECT * FROM app_order ORDER BY created_at DESC, order_id DESC "
+                    "LIMIT 50"
+                ).fetchall()
+
+        def worker(write, seed):
+            rng = random.Random(seed)
+            done = errors = 0
+            conn = self.connect(path, pragmas) if persistent else None
+            while time.perf_counter() < stop:
+                # without persistent connections every operation, like every
+                # request, opens its own connection
+                current = conn or self.connect(path, pragmas)
+                try:
+                    operation(current, write, rng)
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if current.in_transaction:
+                        current.execute("ROLLBACK")
+                finally:
+                    if not persistent:
+                        current.close()
+            if conn:
+                conn.close()
+            with lock:
+                counts["writes" if write else "reads"] += done
+                counts["errors"] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=(False, i))
+            for i in range(options["readers"])
+        ] + [
+            threading.Thread(target=worker, args=(True, 1000 + i))
+            for i in range(options["writers"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts["reads"], counts["writes"], counts["errors"]
@@ -0,0 +1,131 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+PROFILES = ["backend.settings", "backend.settings_api"]
+
+
+def profile_env(profile):
+    """The environment of a process running with `profile`."""
+    # backend/settings_api.py needs a secret key, any will do for a benchmark
+    return {
+        "DJANGO_SECRET_KEY": "bench_startup",
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": profile,
+    }
+
+
+def import_times(profile, entry_point="backend.wsgi"):
+    """
+    Runs `python -X importtime -c "import <entry_point>"` and returns
+    (total ms, {top level package: ms}) from its self times.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry_point}"],
+        env=profile_env(profile),
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise CommandError(process.stderr.strip().splitlines()[-1])
+    packages = Counter()
+    # "import time: self [us] | cumulative | imported package"
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return sum(packages.values()), packages
+
+
+def probe(profile, server, path, database):
+    """app.startup's numbers, plus cold_ms: from spawning the process to the first response."""
+    spawned_at = time.time()
+    process = subprocess.run(
+        [sys.executable, "-m", "app.startup", server, path, database],
+        env=profile_env(profile),
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise CommandError(process.stderr.strip().splitlines()[-1])
+    result = json.loads(process.stdout.splitlines()[-1])
+    # includes starting the interpreter, which boot_ms doesn't
+    result["cold_ms"] = (result["responded_at"] - spawned_at) * 1000
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the full settings with the lean API profile: import time, "
+        "time to the first response through backend/wsgi.py and asgi.py and "
+        "the per-request middleware overhead, on a throwaway test database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", nargs="+", default=PROFILES)
+        parser.add_argument("--path", default="/products/?page_size=10")
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"]
+        runs = options["runs"]
+        path = options["path"]
+
+        self.stdout.write("python -X importtime (median ms of the self times)")
+        for profile in profiles:
+            results = [import_times(profile) for _ in range(runs)]
+            total = statistics.median(total for total, _ in results)
+            heaviest = ", ".join(
+                f"{name} {ms:.0f}" for name, ms in results[-1][1].most_common(5)
+            )
+            self.stdout.write(f"  {profile:<22} {total:>7.1f}   {heaviest}")
+
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            call_command(
+                "populate_db", "--products=100", "--users=5", "--orders=100", stdout=StringIO()
+            )
+            database = str(connection.settings_dict["NAME"])
+            # the probes open the file themselves
+            connection.close()
+
+            self.stdout.write(f"\nGET {path}, median of {runs} fresh processes")
+            self.stdout.write(
+                f"  {'':<22} {'server':<6} {'cold ms':>8} {'boot ms':>8} "
+                f"{'first ms':>9} {'request us':>11} {'middleware us':>14}"
+            )
+            for profile in profiles:
+                for server in ("wsgi", "asgi"):
+                    results = [probe(profile, server, path, database) for _ in range(runs)]
+                    if any(result["status"] != 200 for result in results):
+                        raise CommandError(f"{profile} {server}: {results[0]['status']}")
+
+                    def median(key):
+                        return statistics.median(result[key] for result in results)
+
+                    overhead = (
+                        f"{median('request_us') - median('bare_us'):>14.0f}"
+                        if "bare_us" in results[0]
+                        else f"{'':>14}"
+                    )
+                    self.stdout.write(
+                        f"  {profile:<22} {server:<6} {median('cold_ms'):>8.0f} "
+                        f"{median('boot_ms'):>8.0f} {median('first_ms'):>9.1f} "
+                        f"{median('request_us'):>11.0f} {overhead}"
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
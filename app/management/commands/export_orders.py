@@ -0,0 +1,79 @@
+import resource
+import sys
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from app.exports import FORMATS, LAYOUTS, export_chunks, export_queryset, gzip_chunks
+
+
+def parse_since(value):
+    # 2025-01-01 or 2025-01-01T12:00:00+00:00, without a zone in the
+    # current time zone
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"--since: {value!r} isn't a date or a date and time.")
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams every order with its items to NDJSON or CSV, optionally "
+        "gzipped, in constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", "-o", default="-", help="file to write, - for stdout (default)"
+        )
+        parser.add_argument("--format", choices=FORMATS, default="ndjson")
+        parser.add_argument(
+            "--layout", choices=LAYOUTS, default="nested", help="NDJSON only, CSV is flat"
+        )
+        parser.add_argument("--since", help="only orders created at or after this time")
+        parser.add_argument(
+            "--gzip", action="store_true", help="compress (implied by a .gz output)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = parse_since(options["since"]) if options["since"] else None
+        output = options["output"]
+        stats = {}
+        chunks = export_chunks(
+            export_queryset(since),
+            options["format"],
+            options["layout"],
+            chunk_size=options["chunk_size"],
+            stats=stats,
+        )
+        if options["gzip"] or output.endswith(".gz"):
+            chunks = gzip_chunks(chunks)
+
+        start = time.perf_counter()
+        written = 0
+        file = sys.stdout.buffer if output == "-" else open(output, "wb")
+        try:
+            for chunk in chunks:
+                file.write(chunk)
+                written += len(chunk)
+        finally:
+            if file is not sys.stdout.buffer:
+                file.close()
+        elapsed = time.perf_counter() - start
+
+        # the report goes to stderr, stdout may be the export itself
+        rate = stats["orders"] / elapsed if elapsed else 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+        self.stderr.write(
+            f"{stats['orders']:,} orders, {written:,} bytes in {elapsed:.1f}s "
+            f"({rate:,.0f} orders/sec), peak RSS {peak / 1024:,.1f} MiB"
+        )
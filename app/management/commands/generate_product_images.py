@@ -0,0 +1,83 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app import thumbnails
+from app.models import Product
+
+
+def init_worker():
+    # spawned (not forked) workers start without Django set up, forked
+    # ones must not share the parent's database connections
+    django.setup()
+    connections.close_all()
+
+
+def render(product_id):
+    try:
+        return product_id, thumbnails.render_variants(product_id) is not None, None
+    except Exception as exc:
+        return product_id, False, repr(exc)
+
+
+class Command(BaseCommand):
+    help = (
+        "Makes the image variants (settings.PRODUCT_IMAGE_VARIANTS) of every "
+        "product whose image doesn't have them yet, in several processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="processes, 1 runs in this process",
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="also products that have variants"
+        )
+
+    def handle(self, *args, **options):
+        products = (
+            Product.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .only("image", "image_variants")
+            .order_by("pk")
+        )
+        pending = [
+            product.pk
+            for product in products.iterator()
+            if options["force"] or thumbnails.needs_variants(product)
+        ]
+        if not pending:
+            self.stdout.write("Every product image has its variants.")
+            return
+
+        start = time.perf_counter()
+        if options["workers"] <= 1:
+            results = map(render, pending)
+        else:
+            # the workers open their own connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(options["workers"], initializer=init_worker)
+            results = pool.map(render, pending, chunksize=16)
+
+        done = failed = 0
+        for product_id, ok, error in results:
+            if error:
+                failed += 1
+                self.stderr.write(f"Product {product_id}: {error}")
+            elif ok:
+                done += 1
+        if options["workers"] > 1:
+            pool.shutdown()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Made the variants of {done} images in {elapsed:.2f}s "
+            f"({done / elapsed:.1f} images/s), {failed} failed"
+        )
@@ -0,0 +1,172 @@
+import csv
+import gzip
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from app.models import Product
+from app.product_cache import invalidate_products
+from app.serializers import ProductImportSerializer
+
+# Supplier catalog import
+#   python manage.py import_products feed.csv
+#   python manage.py import_products feed.ndjson.gz --batch-size 10000
+
+# The feed is read row by row (csv.DictReader / one JSON object per line),
+# so a file of millions of rows never has to fit in memory. Every row is
+# validated with the rules of ProductSerializer (ProductImportSerializer,
+# so validate_price too), the good ones are written with one
+# INSERT ... ON CONFLICT (sku) DO UPDATE per batch: new skus are created,
+# known ones get the feed's name, description, price and stock.
+
+# A bad row doesn't stop the import, it is written with its line number
+# and errors to the rejects file (one JSON object per line).
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# the columns the feed overwrites on an existing product
+UPDATE_FIELDS = ["name", "description", "price", "stocks", "updated_at"]
+
+
+def feed_format(path):
+    suffixes = [suffix for suffix in Path(path).suffixes if suffix != ".gz"]
+    return FORMATS.get(suffixes[-1] if suffixes else "")
+
+
+def open_feed(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_rows(file, format):
+    """Yields (line number, row), row is a dict or the error of a bad line."""
+    if format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, ValidationError({"non_field_errors": [f"Invalid JSON: {exc}"]})
+            continue
+        if not isinstance(row, dict):
+            row = ValidationError({"non_field_errors": ["Expected a JSON object."]})
+        yield number, row
+
+
+class Rejects:
+    # the rejects file, only created once there is a bad row
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.count = 0
+
+    def write(self, line, row, errors):
+        if self.file is None:
+            self.file = open(self.path, "w", encoding="utf-8")
+        record = {"line": line, "errors": errors}
+        if row is not None:
+            record["row"] = row
+        self.file.write(json.dumps(record) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates products from a CSV or NDJSON supplier feed "
+        "(optionally gzipped), matched on their sku"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=sorted(set(FORMATS.values())))
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--rejects", help="where to write the bad rows (default: <path>.rejects.ndjson)"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or feed_format(path)
+        if format is None:
+            raise CommandError(f"Can't tell the format of {path}, use --format.")
+        batch_size = options["batch_size"]
+        rejects = Rejects(options["rejects"] or f"{path}.rejects.ndjson")
+        # one serializer for every row: run_validation() doesn't keep any
+        # state, and building the fields again per row would cost more
+        # than validating
+        serializer = ProductImportSerializer()
+        rows = created = updated = 0
+        start = time.perf_counter()
+
+        try:
+            with open_feed(path) as file:
+                feed = read_rows(file, format)
+                while batch := list(islice(feed, batch_size)):
+                    products = {}
+                    for line, row in batch:
+                        if isinstance(row, ValidationError):
+                            rejects.write(line, None, row.detail)
+                            continue
+                        try:
+                            data = serializer.run_validation(row)
+                        except ValidationError as exc:
+                            rejects.write(line, row, exc.detail)
+                            continue
+                        # a sku twice in a batch: the later row wins, like
+                        # it would in two batches
+                        products[data["sku"]] = Product(**data)
+
+                    new, changed = self.upsert(products)
+                    rows += len(batch)
+                    created += new
+                    updated += changed
+                    if options["verbosity"] > 1:
+                        elapsed = time.perf_counter() - start
+                        self.stdout.write(f"{rows:,} rows, {rows / elapsed:,.0f} rows/sec")
+        except (OSError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f"Can't read {path}: {exc}")
+        finally:
+            rejects.close()
+
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec): "
+            f"{created:,} created, {updated:,} updated, {rejects.count:,} rejected"
+        )
+        if rejects.count:
+            self.stdout.write(f"Rejected rows written to {rejects.path}")
+
+    def upsert(self, products):
+        """Writes a batch, returns (created, updated)."""
+        if not products:
+            return 0, 0
+        with transaction.atomic():
+            # the skus that are already there (in_bulk batches the IN list)
+            existing = Product.objects.only("sku").in_bulk(list(products), field_name="sku")
+            # bulk_create() skips save() and the signals; the FTS triggers
+            # (app/search.py) still index the new and changed names
+            Product.objects.bulk_create(
+                products.values(),
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=UPDATE_FIELDS,
+            )
+        invalidate_products(product.pk for product in existing.values())
+        return len(products) - len(existing), len(existing)
@@ -1,71 +1,230 @@
 import random
+import time
+import uuid
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from itertools import accumulate
 
-from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.utils import lorem_ipsum
+from django.db import transaction
+from django.utils import lorem_ipsum, timezone
 
-from app.models import Order, OrderItem, Product, User
+from app.models import DailyProductSales, Order, OrderItem, Product, User
+
+# the first products of every catalog
+SAMPLE_PRODUCTS = [
+    ("A Scanner Darkly", Decimal("12.99"), 4),
+    ("Coffee Machine", Decimal("70.99"), 6),
+    ("Velvet Underground & Nico", Decimal("15.99"), 11),
+    ("Enter the Wu-Tang (36 Chambers)", Decimal("17.99"), 2),
+    ("Digital Camera", Decimal("350.99"), 4),
+    ("Watch", Decimal("500.05"), 0),
+]
+
+
+@contextmanager
+def manual_created_at():
+    # auto_now_add would overwrite the generated order dates with now()
+    field = Order._meta.get_field("created_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
 
 
 class Command(BaseCommand):
-    help = "Creates application data"
+    help = (
+        "Creates a deterministic benchmark data set. Running it again with "
+        "the same options doesn't create any duplicates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument(
+            "--items-per-order",
+            type=int,
+            default=3,
+            help="maximum number of different products per order",
+        )
+        parser.add_argument("--years", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        # lorem_ipsum uses the global random module
+        random.seed(options["seed"])
+        self.rng = random.Random(options["seed"])
 
-    def handle(self, *args, **kwargs):
         # get or create superuser
         user = User.objects.filter(username="admin").first()
         if not user:
             user = User.objects.create_superuser(username="admin", password="test")
 
-        # create products - name, desc, price, stocks, image
-        products = [
-            Product(
-                name="A Scanner Darkly",
-                description=lorem_ipsum.paragraph(),
-                price=Decimal("12.99"),
-                stocks=4,
-            ),
-            Product(
-                name="Coffee Machine",
-                description=lorem_ipsum.paragraph(),
-                price=Decimal("70.99"),
-                stocks=6,
-            ),
-            Product(
-                name="Velvet Underground & Nico",
-                description=lorem_ipsum.paragraph(),
-                price=Decimal("15.99"),
-                stocks=11,
-            ),
-            Product(
-                name="Enter the Wu-Tang (36 Chambers)",
-                description=lorem_ipsum.paragraph(),
-                price=Decimal("17.99"),
-                stocks=2,
-            ),
-            Product(
-                name="Digital Camera",
-                description=lorem_ipsum.paragraph(),
-                price=Decimal("350.99"),
-                stocks=4,
-            ),
-            Product(
-                name="Watch",
-                description=lorem_ipsum.paragraph(),
-                price=Decimal("500.05"),
-                stocks=0,
-            ),
-        ]
-
-        # create products & re-fetch from DB
-        Product.objects.bulk_create(products)
-        products = Product.objects.all()
-
-        # create some dummy orders tied to the superuser
-        for _ in range(3):
-            # create an Order with 2 order items
-            order = Order.objects.create(user=user)
-            for product in random.sample(list(products), 2):
-                OrderItem.objects.create(
-                    order=order, product=product, quantity=random.randint(1, 3)
+        prices = self.timed("products", self.create_products, options["products"])
+        user_ids = self.timed("users", self.create_users, options["users"]) or [user.pk]
+        self.timed(
+            "orders",
+            self.create_orders,
+            options["orders"],
+            user_ids,
+            prices,
+            options["items_per_order"],
+            options["years"],
+        )
+        # bulk_create() doesn't record the sales, see DailyProductSales
+        self.timed("rollup", self.rebuild_rollup)
+
+    def timed(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        rows = self.created
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{label:<9} {rows:>10,} rows in {elapsed:7.2f}s ({rate:,.0f} rows/s)"
+        )
+        return result
+
+    def batches(self, count):
+        for start in range(0, count, self.batch_size):
+            yield range(start, min(start + self.batch_size, count))
+
+    def create_products(self, count):
+        """Products get the ids 1..count; returns their prices by id."""
+        self.created = 0
+        words = lorem_ipsum.WORDS
+        descriptions = [lorem_ipsum.paragraph() for _ in range(50)]
+        prices = [None]
+        for batch in self.batches(count):
+            products = []
+            for i in batch:
+                if i < len(SAMPLE_PRODUCTS):
+                    name, price, stocks = SAMPLE_PRODUCTS[i]
+                else:
+                    name = " ".join(self.rng.sample(words, 2)).title()
+                    # mostly cheap products, a few expensive ones
+                    cents = int(self.rng.lognormvariate(7.5, 1.0)) + 99
+                    price = Decimal(min(cents, 99_999_999)) / 100
+                    stocks = self.rng.choice([0, *range(1, 200)])
+                prices.append(price)
+                products.append(
+                    Product(
+                        id=i + 1,
+                        name=name,
+                        description=self.rng.choice(descriptions),
+                        price=price,
+                        stocks=stocks,
+                    )
+                )
+            # a second run doesn't create them again
+            existing = set(
+                Product.objects.filter(pk__in=[p.pk for p in products]).values_list(
+                    "pk", flat=True
+                )
+            )
+            products = [p for p in products if p.pk not in existing]
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+            self.created += len(products)
+        return prices
+
+    def create_users(self, count):
+        self.created = 0
+        # an unusable password, hashing a real one for every user is slow
+        password = make_password(None)
+        user_ids = []
+        for batch in self.batches(count):
+            usernames = [f"user{i:07d}" for i in batch]
+            existing = set(
+                User.objects.filter(username__in=usernames).values_list(
+                    "username", flat=True
+                )
+            )
+            new = [name for name in usernames if name not in existing]
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    [User(username=name, password=password) for name in new]
+                )
+            user_ids += (
+                User.objects.filter(username__in=usernames)
+                .order_by("username")
+                .values_list("pk", flat=True)
+            )
+            self.created += len(new)
+        return user_ids
+
+    def create_orders(self, count, user_ids, prices, items_per_order, years):
+        self.created = 0
+        product_ids = list(range(1, len(prices)))
+        if not product_ids:
+            return
+        # skewed popularity: the n-th most popular product is ordered
+        # about 1/n as often as the most popular one
+        self.rng.shuffle(product_ids)
+        cum_weights = list(accumulate(1 / rank for rank in range(1, len(product_ids) + 1)))
+        now = timezone.now()
+        span = timedelta(days=365 * years).total_seconds()
+
+        for batch in self.batches(count):
+            orders = []
+            items = []
+            for _ in batch:
+                # drawn even for orders that already exist, so every run
+                # produces the same orders
+                order_id = uuid.UUID(int=self.rng.getrandbits(128), version=4)
+                created_at = now - timedelta(seconds=self.rng.random() * span)
+                order = Order(
+                    order_id=order_id,
+                    user_id=self.rng.choice(user_ids),
+                    created_at=created_at,
+                    status=self.status(now - created_at),
                 )
+
+                wanted = min(self.rng.randint(1, items_per_order), len(product_ids))
+                chosen = set()
+                while len(chosen) < wanted:
+                    rank = bisect(cum_weights, self.rng.random() * cum_weights[-1])
+                    chosen.add(product_ids[min(rank, len(product_ids) - 1)])
+                for product_id in sorted(chosen):
+                    item = OrderItem(
+                        order=order,
+                        product_id=product_id,
+                        quantity=self.rng.randint(1, 3),
+                        unit_price=prices[product_id],
+                    )
+                    order.total_price += item.item_subtotal
+                    items.append(item)
+                orders.append(order)
+
+            existing = set(
+                Order.objects.filter(pk__in=[o.pk for o in orders]).values_list(
+                    "pk", flat=True
+                )
+            )
+            orders = [o for o in orders if o.pk not in existing]
+            items = [i for i in items if i.order_id not in existing]
+            with transaction.atomic(), manual_created_at():
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(items)
+            self.created += len(orders) + len(items)
+
+    def rebuild_rollup(self):
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        self.created = DailyProductSales.objects.count()
+
+    def status(self, age):
+        Status = Order.StatusChoices
+        if age > timedelta(days=14):
+            choices, weights = (Status.DELIVERED, Status.CANCELED), (90, 10)
+        else:
+            choices, weights = (Status.PENDING, Status.DELIVERED, Status.CANCELED), (70, 25, 5)
+        return self.rng.choices(choices, weights)[0]
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the FTS5 product search index (app_product_search) and "
+        "its triggers and re-indexes every product"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="drop the table and the triggers first, e.g. after changing SCHEMA",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search needs SQLite (FTS5).")
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            if options["drop"]:
+                search.uninstall()
+            search.rebuild()
+        with connection.cursor() as cursor:
+            # merges the index b-trees into one, faster searches afterwards
+            cursor.execute(
+                f"INSERT INTO {search.TABLE} ({search.TABLE}) VALUES ('optimize')"
+            )
+            cursor.execute("SELECT count(*) FROM app_product")
+            count = cursor.fetchone()[0]
+        self.stdout.write(
+            f"Indexed {count:,} products in {time.perf_counter() - start:.2f}s"
+        )
@@ -0,0 +1,76 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from app.models import Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfills OrderItem.unit_price and recomputes the stored "
+        "Order.total_price from the order items"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report orders whose stored total is wrong, don't fix them",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        check = options["check"]
+
+        # items created before prices were snapshotted get the current price
+        missing = OrderItem.objects.filter(unit_price__isnull=True)
+        if check:
+            backfilled = missing.count()
+        else:
+            backfilled = missing.update(
+                unit_price=Subquery(
+                    Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+                )
+            )
+
+        checked = mismatched = 0
+        last_pk = None
+        while True:
+            orders = Order.objects.order_by("pk")
+            if last_pk is not None:
+                orders = orders.filter(pk__gt=last_pk)
+            batch = list(orders[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            # sum in Python so the totals are exact Decimals
+            totals = defaultdict(Decimal)
+            items = OrderItem.objects.filter(
+                order__in=batch, unit_price__isnull=False
+            ).values_list("order_id", "unit_price", "quantity")
+            for order_id, unit_price, quantity in items:
+                totals[order_id] += unit_price * quantity
+
+            wrong = []
+            for order in batch:
+                expected = totals[order.pk]
+                if order.total_price != expected:
+                    order.total_price = expected
+                    wrong.append(order)
+
+            checked += len(batch)
+            mismatched += len(wrong)
+            if wrong and not check:
+                with transaction.atomic():
+                    Order.objects.bulk_update(wrong, ["total_price"])
+
+        verb = "Found" if check else "Fixed"
+        self.stdout.write(
+            f"Checked {checked} orders. {verb} {mismatched} wrong totals "
+            f"and {backfilled} items without a unit price."
+        )
@@ -0,0 +1,54 @@
+import logging
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from app import benchmarks
+from app.models import Product, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Many threads buy the same product at once through POST orders/ on a "
+        "throwaway test database; checks nothing is oversold and reports orders/sec"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=500)
+        parser.add_argument("--stocks", type=int, default=300)
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument("--threads", type=int, default=32)
+
+    def handle(self, *args, **options):
+        # every 409 would be logged as a warning
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                users = [
+                    User.objects.create_user(username=f"buyer{i}")
+                    for i in range(min(options["buyers"], 50))
+                ]
+                product = Product.objects.create(
+                    name="Hot product",
+                    description="",
+                    price=Decimal("9.99"),
+                    stocks=options["stocks"],
+                )
+                result = benchmarks.checkout_stress(
+                    product,
+                    users,
+                    options["buyers"],
+                    quantity=options["quantity"],
+                    threads=options["threads"],
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(
+            f"{result['buyers']} buyers: {result['created']} orders, "
+            f"{result['out_of_stock']} out of stock, {result['failed']} failed, "
+            f"stock {result['stocks_before']} -> {result['stocks_after']}, "
+            f"{result['orders_per_sec']} orders/s"
+        )
@@ -0,0 +1,140 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("app.instrumentation")
+
+
+# Request instrumentation
+# https://docs.djangoproject.com/en/5.2/topics/db/instrumentation/
+
+# Records for every request how many SQL queries ran and how long they
+# took (via connection.execute_wrapper), how long the view took and how
+# long rendering the response (serializing it to JSON) took, and sends
+# them to the client in a Server-Timing header, which browsers show in
+# the network tab:
+
+#   Server-Timing: db;dur=3.1;desc="4 queries", view;dur=9.8,
+#                  serialize;dur=1.2, total;dur=11.5
+
+# Requests slower than SLOW_REQUEST_MS are logged together with their
+# slowest queries and the queries that ran more than once. The same query
+# shape running more than N_PLUS_ONE_THRESHOLD times in one request is
+# logged as a likely N+1 problem.
+
+# Enable it with REQUEST_INSTRUMENTATION["ENABLED"] in backend/settings.py.
+
+DEFAULTS = {
+    "ENABLED": False,
+    "SLOW_REQUEST_MS": 500,
+    "N_PLUS_ONE_THRESHOLD": 10,
+}
+
+# "IN (%s, %s, %s)" and "IN (%s)" are the same query shape
+IN_LIST = re.compile(r"\((?:%s, )*%s\)")
+
+
+def query_shape(sql):
+    return IN_LIST.sub("(...)", sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000))
+
+    @property
+    def db_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self, more_than=1):
+        counts = Counter(query_shape(sql) for sql, _ in self.queries)
+        return [(shape, n) for shape, n in counts.most_common() if n > more_than]
+
+
+class RequestInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {**DEFAULTS, **getattr(settings, "REQUEST_INSTRUMENTATION", {})}
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request._instrumentation = {}
+        start = time.perf_counter()
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        end = time.perf_counter()
+        timings = request._instrumentation
+        view_end = timings.get("view_end", end)
+        render_end = timings.get("render_end", view_end)
+        total_ms = (end - start) * 1000
+        metrics = [
+            ("db", recorder.db_ms, f"{len(recorder.queries)} queries"),
+            ("view", (view_end - start) * 1000, None),
+            ("serialize", (render_end - view_end) * 1000, None),
+            ("total", total_ms, None),
+        ]
+        response["Server-Timing"] = ", ".join(
+            f'{name};dur={duration:.1f}' + (f';desc="{desc}"' if desc else "")
+            for name, duration, desc in metrics
+        )
+
+        self.report(request, recorder, total_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF's Response is rendered (serialized to JSON) right after this
+        timings = request._instrumentation
+        timings["view_end"] = time.perf_counter()
+
+        def rendered(response):
+            timings["render_end"] = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, recorder, total_ms):
+        threshold = self.config["N_PLUS_ONE_THRESHOLD"]
+        for shape, count in recorder.repeated_shapes(more_than=threshold):
+            logger.warning(
+                "Possible N+1 in %s %s: query ran %d times: %s",
+                request.method,
+                request.path,
+                count,
+                shape,
+            )
+
+        if total_ms < self.config["SLOW_REQUEST_MS"]:
+            return
+        slowest = sorted(recorder.queries, key=lambda query: query[1], reverse=True)
+        lines = [f"  {duration:.1f} ms  {sql}" for sql, duration in slowest[:5]]
+        lines += [
+            f"  ran {count} times  {shape}" for shape, count in recorder.repeated_shapes()
+        ]
+        logger.warning(
+            "Slow request %s %s: %.1f ms, %d queries, %.1f ms in the database\n%s",
+            request.method,
+            request.path,
+            total_ms,
+            len(recorder.queries),
+            recorder.db_ms,
+            "\n".join(lines),
+        )
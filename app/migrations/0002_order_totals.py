@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:01
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_totals(apps, schema_editor):
+    # existing items get the product's current price, the price they were
+    # ordered at isn't known anymore (like `recompute_order_totals`)
+    Order = apps.get_model("app", "Order")
+    OrderItem = apps.get_model("app", "OrderItem")
+    Product = apps.get_model("app", "Product")
+
+    OrderItem.objects.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+        )
+    )
+
+    # sum in Python so the totals are exact Decimals
+    totals = defaultdict(Decimal)
+    items = OrderItem.objects.values_list("order_id", "unit_price", "quantity")
+    for order_id, unit_price, quantity in items.iterator():
+        totals[order_id] += unit_price * quantity
+
+    orders = []
+    for order in Order.objects.filter(pk__in=totals).only("pk").iterator():
+        order.total_price = totals[order.pk]
+        orders.append(order)
+    Order.objects.bulk_update(orders, ["total_price"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
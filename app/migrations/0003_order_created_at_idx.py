@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'order_id'], name='order_created_at_idx'),
+        ),
+    ]
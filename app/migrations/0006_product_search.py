@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from app import search
+
+
+def install(apps, schema_editor):
+    # FTS5 is SQLite only, see app/search.py
+    search.rebuild(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_order_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='sales_product_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='unique_day_product')],
+            },
+        ),
+    ]
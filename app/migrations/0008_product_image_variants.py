@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:34
+
+from django.db import migrations, models
+
+from app import search
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # SQLite adds the column by rebuilding app_product, which drops the
+    # full-text search triggers (see app/search.py)
+    search.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_daily_product_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:41
+
+from django.db import migrations, models
+
+from app import search
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    # the new column rebuilds app_product on SQLite (see 0008)
+    search.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stocks__gt', 0)), fields=['id'], name='product_in_stock_idx'),
+        ),
+    ]
@@ -1,7 +1,24 @@
 import uuid
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    Avg,
+    BooleanField,
+    Count,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -31,17 +48,64 @@ class User(AbstractUser):
 # how the property is accessed.
 
 
+# in_stock in SQL. Written exactly like the condition of the partial index
+# product_in_stock_idx, so SQLite (and PostgreSQL) can see that a query
+# filtering on it only needs the rows of that index.
+IN_STOCK = Q(stocks__gt=0)
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_in_stock(self):
+        # in_stock computed by the database, Product.in_stock returns it
+        # instead of comparing in Python
+        return self.annotate(
+            in_stock=ExpressionWrapper(IN_STOCK, output_field=BooleanField())
+        )
+
+    def in_stock(self):
+        return self.filter(IN_STOCK)
+
+    def out_of_stock(self):
+        return self.filter(stocks=0)
+
+
 class Product(models.Model):
+    # the supplier's stock keeping unit, the key import_products upserts on;
+    # NULL for products created here (NULLs never collide in a unique index)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stocks = models.PositiveIntegerField()
     image = models.ImageField(upload_to="products/", blank=True, null=True)
+    # {"source": image.name, "thumbnail": path, ...}, the resized copies of
+    # image written by app/thumbnails.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Last-Modified of product_detail (see app/product_cache.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # only the products that are in stock, in id order: browsing
+            # products/?in_stock=true reads this index page by page and
+            # skips the sold out products without looking at them
+            models.Index(fields=["id"], condition=IN_STOCK, name="product_in_stock_idx"),
+        ]
 
     @property
     def in_stock(self):
+        # the annotation of Product.objects.with_in_stock() when there is one
+        if "_in_stock" in self.__dict__:
+            return self.__dict__["_in_stock"]
         return self.stocks > 0
 
+    @in_stock.setter
+    def in_stock(self, value):
+        # set by the queryset for the annotation
+        self.__dict__["_in_stock"] = value
+
     def __str__(self):
         return self.name
 
@@ -65,6 +129,58 @@ class Product(models.Model):
 # preventing users from guessing other record IDs in your system.
 
 
+class SpendingQuerySet(models.QuerySet):
+    def spending_summary(self):
+        """
+        Lifetime value, number of orders and average order value of the
+        orders in the queryset (canceled ones don't count), in one
+        aggregate query.
+        """
+        placed = self.exclude(status=Order.StatusChoices.CANCELED)
+        return placed.aggregate(
+            lifetime_value=Coalesce(Sum("total_price"), Value(Decimal("0.00"))),
+            order_count=Count("pk"),
+            average_order_value=Avg("total_price"),
+        )
+
+
+class OrderQuerySet(SpendingQuerySet):
+    def for_listing(self, items=None):
+        # One query for the orders (with their user joined in) and one
+        # query for all of their items (with each product joined in),
+        # no matter how many orders are on the page.
+        # items: the OrderItem fields to load (only()), e.g.
+        # ["quantity", "product__name"], None for all of them, False for
+        # no items at all (see app/fieldsets.py)
+        orders = self.select_related("user")
+        if items is False:
+            return orders
+        queryset = OrderItem.objects.select_related("product")
+        if items is not None:
+            queryset = queryset.only("order", *items)
+            if not any(name.startswith("product__") for name in items):
+                # the product isn't read, don't join it
+                queryset = queryset.select_related(None)
+        return orders.prefetch_related(models.Prefetch("items", queryset=queryset))
+
+    def with_item_counts(self):
+        # item_count (lines) and units (sum of the quantities) of every
+        # order, counted by the database in the same query. Correlated
+        # subqueries instead of JOIN + GROUP BY, so only the orders of the
+        # page are counted (one lookup in the unique_order_product index
+        # each), not all orders matching the filter before LIMIT.
+        # The total is total_price, stored on the order.
+        items = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+        return self.annotate(
+            item_count=Coalesce(
+                Subquery(items.annotate(count=Count("pk")).values("count")), 0
+            ),
+            units=Coalesce(
+                Subquery(items.annotate(units=Sum("quantity")).values("units")), 0
+            ),
+        )
+
+
 class Order(models.Model):
     class StatusChoices(models.TextChoices):
         PENDING = "Pending"
@@ -72,7 +188,8 @@ class Order(models.Model):
         CANCELED = "Canceled"
 
     order_id = models.UUIDField(primary_key=True, default=uuid.uuid4)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # no index of its own, order_user_created_idx starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING
@@ -81,6 +198,56 @@ class Order(models.Model):
         Product, through="OrderItem", related_name="orders"
     )
 
+    # Denormalized sum of the items' subtotals, kept up to date by
+    # OrderItem.save()/delete(). Rebuild with `recompute_order_totals`.
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of orders/ (see app/pagination.py)
+            models.Index(fields=["created_at", "order_id"], name="order_created_at_idx"),
+            # the filters of orders/ (see app/filters.py), order_id is
+            # included so the pages can be read in index order
+            models.Index(
+                fields=["user", "created_at", "order_id"], name="order_user_created_idx"
+            ),
+            models.Index(
+                fields=["status", "created_at", "order_id"],
+                name="order_status_created_idx",
+            ),
+            models.Index(fields=["total_price", "order_id"], name="order_total_price_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the status as loaded, see save()
+        instance._saved_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # canceling an order takes its sales out of the daily rollup,
+        # un-canceling puts them back
+        canceled = self.StatusChoices.CANCELED
+        previous = getattr(self, "_saved_status", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous is not None and (previous == canceled) != (self.status == canceled):
+                lines = DailyProductSales.lines(self, self.items.all(), canceled=True)
+                if self.status == canceled:
+                    DailyProductSales.objects.record(removed=lines)
+                else:
+                    DailyProductSales.objects.record(added=lines)
+        self._saved_status = self.status
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            removed = DailyProductSales.lines(self, self.items.all())
+            DailyProductSales.objects.record(removed=removed)
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"Order {self.order_id} by {self.user.username}"
 
@@ -148,10 +315,285 @@ class OrderItem(models.Model):
                               related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # Price of the product at the time it was ordered, so later price
+    # changes don't rewrite the history of past orders.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    class Meta:
+        constraints = [
+            # a product appears once per order, more of it means a higher quantity
+            models.UniqueConstraint(
+                fields=["order", "product"], name="unique_order_product"
+            ),
+        ]
 
     @property
     def item_subtotal(self):
-        return self.product.price * self.quantity
+        return self.unit_price * self.quantity
+
+    def _adjust_order_total(self, order_id, delta):
+        Order.objects.filter(pk=order_id).update(total_price=F("total_price") + delta)
+        # keep an already loaded order in sync, so a later order.save()
+        # doesn't write back a stale total
+        if OrderItem.order.is_cached(self) and self.order.pk == order_id:
+            self.order.total_price += delta
+
+    def save(self, *args, **kwargs):
+        previous = None
+        if not self._state.adding:
+            previous = (
+                OrderItem.objects.filter(pk=self.pk)
+                .values("order_id", "product_id", "unit_price", "quantity")
+                .first()
+            )
+        # a line switched to another product gets that product's price
+        if self.unit_price is None or (
+            previous and previous["product_id"] != self.product_id
+        ):
+            self.unit_price = self.product.price
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            removed = []
+            if previous:
+                self._adjust_order_total(
+                    previous["order_id"],
+                    -previous["unit_price"] * previous["quantity"],
+                )
+                before = OrderItem(
+                    product_id=previous["product_id"],
+                    quantity=previous["quantity"],
+                    unit_price=previous["unit_price"],
+                )
+                order = self.order
+                if order.pk != previous["order_id"]:
+                    order = Order.objects.get(pk=previous["order_id"])
+                removed = DailyProductSales.lines(order, [before])
+            self._adjust_order_total(self.order_id, self.item_subtotal)
+            DailyProductSales.objects.record(
+                added=DailyProductSales.lines(self.order, [self]), removed=removed
+            )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self._adjust_order_total(self.order_id, -self.item_subtotal)
+            DailyProductSales.objects.record(
+                removed=DailyProductSales.lines(self.order, [self])
+            )
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.quantity} X {self.product.name} in Order {self.order.order_id}"
+
+
+# Note: bulk_create(), QuerySet.update() and QuerySet.delete() don't call
+# save()/delete(), so code using them has to set unit_price and
+# Order.total_price itself (or run `recompute_order_totals` afterwards),
+# and record the sales in DailyProductSales (or run `rebuild_sales_rollup`).
+
+
+# Order archive
+# Delivered and canceled orders that are months old are hardly ever read,
+# but they make every index of app_order and app_orderitem bigger. The
+# archive_orders management command moves them into these two tables,
+# which have the same columns (and so work with OrderSerializer), and
+# app/archive.py looks an order up in the archive when it isn't in
+# Order anymore. Their sales stay in DailyProductSales.
+
+
+class ArchivedOrder(models.Model):
+    # the values of the Order, copied as they were
+    order_id = models.UUIDField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Order.StatusChoices.choices)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    archived_at = models.DateTimeField()
+
+    objects = SpendingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # a user's spending_summary() (users/<id>/orders/)
+            models.Index(fields=["user", "created_at"], name="archived_order_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(
+        ArchivedOrder, on_delete=models.CASCADE, related_name="items"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    @property
+    def item_subtotal(self):
+        return self.unit_price * self.quantity
+
+
+def remove_product_from_totals(product_id):
+    """
+    Takes the lines of a product off the totals of the live and archived
+    orders. Called before the product is deleted (app/signals.py): the
+    cascade deletes its lines without OrderItem.delete().
+    """
+    for orders, items in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        total_price = orders._meta.get_field("total_price")
+        lines = (
+            items.objects.filter(order=OuterRef("pk"), product_id=product_id)
+            .order_by()
+            .values("order")
+            .annotate(
+                subtotal=Sum(
+                    ExpressionWrapper(
+                        F("unit_price") * F("quantity"), output_field=total_price
+                    )
+                )
+            )
+            .values("subtotal")
+        )
+        orders.objects.filter(items__product_id=product_id).update(
+            total_price=F("total_price") - Coalesce(Subquery(lines), Value(Decimal("0")))
+        )
+
+
+# Daily sales rollup
+# Revenue reports (reports/sales/) read from this small table of
+# (day, product) rows instead of summing every OrderItem, so a report
+# for a year costs the same however many orders there are.
+
+# The rows are kept up to date as orders are placed (see
+# DailyProductSales.objects.record()) and canceled (Order.save()).
+# Canceled orders aren't in it. The day is the order's created_at date in
+# TIME_ZONE.
+
+
+class DailyProductSalesQuerySet(models.QuerySet):
+    def record(self, added=(), removed=()):
+        """
+        Adds the `added` and subtracts the `removed` order lines (see
+        DailyProductSales.lines()) with one upsert:
+        INSERT ... ON CONFLICT (day, product) DO UPDATE SET units = units + ...
+        """
+        totals = defaultdict(lambda: [0, Decimal(0), 0])
+        for sign, lines in ((1, added), (-1, removed)):
+            for day, product_id, quantity, unit_price in lines:
+                row = totals[(day, product_id)]
+                row[0] += sign * quantity
+                row[1] += sign * quantity * (unit_price or 0)
+                row[2] += sign
+        # a line removed and added again (a changed quantity) doesn't
+        # change anything but the units and the revenue
+        rows = [(day, pk, *row) for (day, pk), row in totals.items() if any(row)]
+        if not rows:
+            return
+
+        conn = connections[self.db]
+        meta = self.model._meta
+        columns = ("day", "product_id", "units", "revenue", "order_count")
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in columns[2:])
+        sql = (
+            f"INSERT INTO {meta.db_table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT (day, product_id) DO UPDATE SET {updates}"
+        )
+        field = meta.get_field("revenue")
+        params = [
+            (
+                conn.ops.adapt_datefield_value(day),
+                pk,
+                units,
+                conn.ops.adapt_decimalfield_value(
+                    revenue, field.max_digits, field.decimal_places
+                ),
+                orders,
+            )
+            for day, pk, units, revenue, orders in rows
+        ]
+        with conn.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def rebuild(self, start, end):
+        """
+        Recomputes the rows of the days start..end (dates, inclusive) from
+        the orders. Returns the number of rows written.
+        """
+        tz = timezone.get_current_timezone()
+        since = timezone.make_aware(datetime.combine(start, time.min), tz)
+        until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+        # the archived orders (see archive_orders) are sales too
+        totals = {}
+        for items in (OrderItem.objects.all(), ArchivedOrderItem.objects.all()):
+            for row in self._daily_sales(items, since, until).iterator():
+                key = (row.pop("day"), row.pop("product_id"))
+                if key in totals:
+                    for name, value in row.items():
+                        totals[key][name] += value
+                else:
+                    totals[key] = row
+        rows = [
+            self.model(day=day, product_id=product_id, **row)
+            for (day, product_id), row in totals.items()
+        ]
+        with transaction.atomic(using=self.db):
+            self.filter(day__gte=start, day__lte=end).delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def _daily_sales(self, items, since, until):
+        # created_at ranges instead of __date so order_created_at_idx is used
+        return (
+            items.filter(order__created_at__gte=since, order__created_at__lt=until)
+            .exclude(order__status=Order.StatusChoices.CANCELED)
+            .annotate(day=TruncDate("order__created_at"))
+            .values("day", "product_id")
+            .annotate(
+                units=Sum("quantity"),
+                revenue=Sum(
+                    F("quantity") * F("unit_price"),
+                    output_field=self.model._meta.get_field("revenue"),
+                ),
+                # an order has one line per product
+                order_count=Count("order_id"),
+            )
+            .order_by()
+        )
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # orders with the product on that day
+    order_count = models.IntegerField(default=0)
+
+    objects = DailyProductSalesQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # also the index of the day range queries
+            models.UniqueConstraint(fields=["day", "product"], name="unique_day_product"),
+        ]
+        indexes = [
+            models.Index(fields=["product", "day"], name="sales_product_day_idx"),
+        ]
+
+    @staticmethod
+    def lines(order, items, canceled=False):
+        """
+        The (day, product id, quantity, unit price) of the items of an
+        order for record(); nothing for a canceled order, unless
+        `canceled` is set (the order is being canceled).
+        """
+        if order.status == Order.StatusChoices.CANCELED and not canceled:
+            return []
+        day = timezone.localdate(order.created_at)
+        return [(day, item.product_id, item.quantity, item.unit_price) for item in items]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}: {self.units} units, {self.revenue}"
@@ -0,0 +1,222 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from app.models import Product
+from app.search import search_products
+
+
+# Keyset (cursor) pagination
+# OFFSET pagination makes the database walk over and throw away every row
+# before the requested page, so page 10,000 is much slower than page 1.
+# Keyset pagination remembers the ordering values of the last row that was
+# sent ("the cursor") and asks for the rows after it instead:
+
+#   WHERE created_at < :created_at
+#      OR (created_at = :created_at AND order_id < :order_id)
+#   ORDER BY created_at DESC, order_id DESC
+#   LIMIT :page_size
+
+# With an index on the ordering columns every page costs the same.
+# The ordering has to be unique, that's why orders are ordered by
+# (created_at, order_id) and not by created_at alone.
+
+
+def query_params(request):
+    # DRF requests have .query_params, the plain Django requests of the
+    # async views only .GET
+    return getattr(request, "query_params", request.GET)
+
+
+class KeysetPagination(BasePagination):
+    ordering = ("id",)
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def __init__(self, ordering=None):
+        # the ordering can be chosen per request, e.g. by ?ordering=
+        if ordering:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.paginate_rows(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        # same as paginate_queryset() for the async views
+        queryset = self.page_queryset(queryset, request)
+        return self.paginate_rows([obj async for obj in queryset])
+
+    def page_queryset(self, queryset, request):
+        self.model = queryset.model
+        self.start(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self.flip(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.after(ordering, self.position))
+
+        # fetch one extra row to find out whether there is another page
+        return queryset[: self.page_size + 1]
+
+    def start(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+    def paginate_rows(self, page):
+        has_more = len(page) > self.page_size
+        page = page[: self.page_size]
+
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = page
+        return page
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(query_params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.link(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.link(self.position_of(self.page[0]), reverse=True)
+
+    def link(self, position, reverse):
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(position, reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def position_of(self, obj):
+        return [getattr(obj, self.field_name(field)) for field in self.ordering]
+
+    def after(self, ordering, position):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = self.field_name(field)
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        # the redundant a >= x gives the database a range to seek to in
+        # the index instead of scanning it from the start
+        first, value = ordering[0], position[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{self.field_name(first)}__{lookup}": value}) & condition
+
+    def encode_cursor(self, position, reverse):
+        payload = {"p": [str(value) for value in position]}
+        if reverse:
+            payload["r"] = 1
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        return urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = query_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode(encoded + padding))
+            values = payload["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.to_python(field, value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (BinasciiError, TypeError, KeyError, ValueError, ValidationError):
+            raise NotFound("Invalid cursor")
+        return position, bool(payload.get("r"))
+
+    def to_python(self, field, value):
+        return self.model._meta.get_field(self.field_name(field)).to_python(value)
+
+    def columns(self):
+        # the fields position_of() reads, for QuerySet.only()
+        return [self.field_name(field) for field in self.ordering]
+
+    @staticmethod
+    def field_name(field):
+        return field.lstrip("-")
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+
+class ProductPagination(KeysetPagination):
+    ordering = ("id",)
+
+
+class OrderPagination(KeysetPagination):
+    # newest orders first, order_id breaks ties between equal timestamps
+    ordering = ("-created_at", "-order_id")
+
+
+class SearchPagination(KeysetPagination):
+    # best match first (see app/search.py), the id breaks ties
+    ordering = ("rank", "id")
+
+    def paginate_search(self, match, request, fields=None):
+        self.model = Product
+        self.start(request)
+        page = search_products(
+            match,
+            self.page_size + 1,
+            position=self.position,
+            reverse=self.reverse,
+            fields=fields,
+        )
+        return self.paginate_rows(page)
+
+    def to_python(self, field, value):
+        if field == "rank":
+            return float(value)
+        return super().to_python(field, value)
@@ -0,0 +1,144 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.shortcuts import aget_object_or_404, get_object_or_404
+
+from app.models import Product
+from app.renderers import FastJSONRenderer
+from app.serializers import ProductSerializer
+
+
+# Django's cache framework
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# product_detail is our hottest read and products rarely change, so the
+# serialized product is kept in the cache together with its ETag and
+# Last-Modified values. The entry is deleted by the post_save/post_delete
+# signal handlers in app/signals.py whenever the product changes.
+
+# Note: QuerySet.update() and bulk_update() don't send signals, code using
+# them on products has to call invalidate_product() itself.
+
+# Keys are "product:<pk>" stored under PRODUCT_CACHE_VERSION. Bump the
+# version when ProductSerializer's output changes and all old entries are
+# ignored at once.
+
+STATS_KEYS = ("hits", "misses", "invalidations")
+
+
+def get_cache():
+    return caches[getattr(settings, "PRODUCT_CACHE_ALIAS", "default")]
+
+
+def product_key(pk):
+    return f"product:{pk}"
+
+
+def _version():
+    return getattr(settings, "PRODUCT_CACHE_VERSION", 1)
+
+
+def _timeout():
+    return getattr(settings, "PRODUCT_CACHE_TIMEOUT", 60 * 60)
+
+
+def _count(name, amount=1):
+    # counters live in the cache too, so with a shared backend (file,
+    # memcached, redis) they add up the numbers of every worker process
+    cache = get_cache()
+    key = f"product_cache:{name}"
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+
+async def _acount(name):
+    cache = get_cache()
+    key = f"product_cache:{name}"
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=None)
+
+
+def _build_entry(product):
+    data = ProductSerializer(product).data
+    # strong ETag: the hash of the exact JSON body
+    body = FastJSONRenderer().render(data)
+    return {
+        "data": dict(data),
+        "etag": '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+        "last_modified": int(product.updated_at.timestamp()),
+    }
+
+
+def format_etag(entry, renderer):
+    """
+    The ETag of the entry in the renderer's format. A strong ETag names
+    one exact body, so the MessagePack (or browsable API) response of a
+    product can't share the JSON one.
+    """
+    if renderer.format == "json":
+        return entry["etag"]
+    return '"%s-%s"' % (entry["etag"].strip('"'), renderer.format)
+
+
+def get_product_entry(pk):
+    """
+    Returns {"data": ..., "etag": ..., "last_modified": ...} for a product,
+    from the cache when possible. Raises Http404 for unknown products.
+    """
+    cache = get_cache()
+    key = product_key(pk)
+    entry = cache.get(key, version=_version())
+    if entry is not None:
+        _count("hits")
+        return entry
+
+    _count("misses")
+    product = get_object_or_404(Product.objects.with_in_stock(), pk=pk)
+    entry = _build_entry(product)
+    cache.set(key, entry, timeout=_timeout(), version=_version())
+    return entry
+
+
+async def aget_product_entry(pk):
+    """Async version of get_product_entry() for the async views."""
+    cache = get_cache()
+    key = product_key(pk)
+    entry = await cache.aget(key, version=_version())
+    if entry is not None:
+        await _acount("hits")
+        return entry
+
+    await _acount("misses")
+    product = await aget_object_or_404(Product.objects.with_in_stock(), pk=pk)
+    entry = _build_entry(product)
+    await cache.aset(key, entry, timeout=_timeout(), version=_version())
+    return entry
+
+
+def invalidate_product(pk):
+    get_cache().delete(product_key(pk), version=_version())
+    _count("invalidations")
+
+
+def invalidate_products(pks):
+    # invalidate_product() for many products in one cache call
+    pks = list(pks)
+    if not pks:
+        return
+    get_cache().delete_many([product_key(pk) for pk in pks], version=_version())
+    _count("invalidations", len(pks))
+
+
+def cache_stats():
+    cache = get_cache()
+    stats = {
+        name: cache.get(f"product_cache:{name}", 0) for name in STATS_KEYS
+    }
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
@@ -0,0 +1,75 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Renderers
+# https://www.django-rest-framework.org/api-guide/renderers/
+
+# DRF's JSONRenderer runs json.dumps() with a Python encoder class, which
+# is most of the CPU time of a big orders/ page once the queries are fast.
+# The renderer is picked from the Accept header (or ?format=) among
+# REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] in backend/settings.py:
+
+#   application/json      FastJSONRenderer, orjson (written in Rust)
+#   application/msgpack   MessagePackRenderer, for our own services
+#   text/html             the browsable API
+
+# FastJSONRenderer returns the same bytes as JSONRenderer: compact
+# separators, UTF-8 instead of \u escapes, U+2028 and U+2029
+# escaped as \u2028 / \u2029 (JavaScript line terminators).
+# orjson writes str, int, dict, list, UUID and datetime itself, everything
+# else (Decimal as a float, lazy translations, querysets, ...) goes
+# through DRF's JSONEncoder.default() like before.
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _default(obj):
+    return JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            # pretty printing (the browsable API, ?indent=) and the
+            # non-default JSON settings are left to json.dumps()
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            body = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. an int larger than 64 bits, which json handles
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2\x80\xa8" in body or b"\xe2\x80\xa9" in body:
+            body = body.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return body
+
+
+class MessagePackRenderer(BaseRenderer):
+    # the same values as the JSON (prices as strings, Decimals that aren't
+    # a DecimalField as floats), in a smaller binary encoding
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_default, use_bin_type=True, datetime=False)
+
+
+def renderer_for(request):
+    """
+    The renderer of a plain Django view (app/async_views.py), picked from
+    the Accept header like DRF does it for the API views.
+    """
+    accept = request.headers.get("Accept", "")
+    if MessagePackRenderer.media_type in accept and "json" not in accept:
+        return MessagePackRenderer()
+    return FastJSONRenderer()
@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+
+from app.models import DailyProductSales
+from app.pagination import query_params
+from app.serializers import SalesReportFilterSerializer
+
+
+# Sales report of reports/sales/
+#   ?start=2025-01-01&end=2025-12-31          revenue and units per day
+#   &product=<id>                             of one product only
+#   &group_by=product&limit=100               the best selling products
+
+# Everything is read from the daily rollup (DailyProductSales in
+# app/models.py), at most one row per product and day, through its
+# unique (day, product) index or the (product, day) index. The number of
+# orders doesn't matter.
+
+# order_count of a rollup row is the number of orders with that product
+# on that day. Adding it up over the products of a day would count an
+# order with two products twice, so it's left out of the per-day rows of
+# the whole catalog.
+
+
+def build_sales_report(request):
+    """
+    Returns the report for SalesReportSerializer. Raises ValidationError (400) for invalid
+    parameters.
+    """
+    serializer = SalesReportFilterSerializer(data=query_params(request))
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    sales = DailyProductSales.objects.filter(
+        day__gte=params["start"], day__lte=params["end"]
+    )
+    if "product" in params:
+        sales = sales.filter(product_id=params["product"])
+
+    sums = {
+        "units": Coalesce(Sum("units"), 0),
+        "revenue": Coalesce(Sum("revenue"), Value(Decimal("0.00"))),
+    }
+    totals = sales.aggregate(**sums)
+
+    if params["group_by"] == "product":
+        rows = (
+            sales.values("product_id")
+            .annotate(**sums, order_count=Sum("order_count"))
+            .order_by("-revenue", "product_id")[: params["limit"]]
+        )
+    else:
+        if "product" in params:
+            sums["order_count"] = Sum("order_count")
+        rows = sales.values("day").annotate(**sums).order_by("day")
+
+    return {
+        "start": params["start"],
+        "end": params["end"],
+        "group_by": params["group_by"],
+        **totals,
+        "results": rows,
+    }
@@ -0,0 +1,167 @@
+import re
+
+from django.db import connection
+
+from app.models import Product
+
+# Full-text product search with SQLite FTS5
+# https://www.sqlite.org/fts5.html
+
+# name__icontains / description__icontains is a LIKE '%word%', which has to
+# read every description of the catalog. An FTS5 table is an inverted index
+# (word -> products), so a search only reads the products that contain the
+# words, and ranks them with bm25 (rarer words and matches in the name
+# count more).
+
+# app_product_search is an "external content" table: it only stores the
+# index, the text itself stays in app_product. The triggers below keep it
+# in sync on every INSERT / UPDATE / DELETE, also for bulk_create(),
+# update() and raw SQL, which skip the model signals. Updates that don't
+# touch the name or the description (stock reservations) don't fire them.
+
+# Django's SQLite backend changes some columns by copying the table into a
+# new one and dropping the old one, which drops the triggers. A migration
+# that does that has to run install() again (the rebuild_search_index
+# management command does it too).
+
+TABLE = "app_product_search"
+
+# prefix='2 3' also indexes the first 2 and 3 letters of every word, so
+# prefix queries (came*) don't have to scan the whole vocabulary
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        name,
+        description,
+        content='app_product',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON app_product
+    BEGIN
+        INSERT INTO {TABLE} (rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON app_product
+    BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+    AFTER UPDATE OF name, description ON app_product
+    WHEN old.name IS NOT new.name OR old.description IS NOT new.description
+    BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {TABLE} (rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+DROP = [
+    f"DROP TRIGGER IF EXISTS {TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {TABLE}_update",
+    f"DROP TABLE IF EXISTS {TABLE}",
+]
+
+# a match in the name weighs 10 times more than one in the description
+RANK = f"bm25({TABLE}, 10.0, 1.0)"
+
+WORD = re.compile(r"\w+")
+
+
+def is_available(using=None):
+    return (using or connection).vendor == "sqlite"
+
+
+def install(using=None):
+    conn = using or connection
+    if not is_available(conn):
+        return
+    with conn.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def uninstall(using=None):
+    conn = using or connection
+    if not is_available(conn):
+        return
+    with conn.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+def rebuild(using=None):
+    """Re-indexes every product from app_product."""
+    conn = using or connection
+    install(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+
+
+def search_words(query):
+    return WORD.findall(query)
+
+
+def match_expression(query):
+    """
+    Turns what the customer typed into an FTS5 query: every word has to
+    match, each one as a prefix ("coffee mach" finds "Coffee Machine").
+    Returns None when there is no word to search for.
+
+    The words are quoted, so FTS5 operators (AND, NEAR, -, ^, column
+    filters) in the input are searched for as words and can't cause a
+    syntax error.
+    """
+    words = search_words(query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_products(match, limit, position=None, reverse=False, fields=None):
+    """
+    One page of products matching `match`, best match first, as Product
+    instances with a .rank (lower is better). `position` is the (rank, id)
+    of the last product of the previous page (keyset pagination, see
+    app/pagination.py); `reverse` pages backwards from it. `fields` only
+    selects those Product fields (the others are deferred, like only()).
+    """
+    op, direction = ("<", "DESC") if reverse else (">", "ASC")
+    params = [match]
+    after = ""
+    if position is not None:
+        rank, pk = position
+        after = f"AND ({RANK} {op} %s OR ({RANK} = %s AND rowid {op} %s))"
+        params += [rank, rank, pk]
+    params.append(limit)
+
+    selected = "p.*"
+    if fields is not None:
+        names = {"id", *fields}
+        selected = ", ".join(
+            f"p.{field.column}" for field in Product._meta.concrete_fields if field.name in names
+        )
+
+    # The page is picked from the index alone and only its products are
+    # joined in, not every match. Ranking still has to score every match,
+    # so a word that is in most of the catalog is the slowest search.
+    return list(
+        Product.objects.raw(
+            f"""
+            SELECT {selected}, p.stocks > 0 AS in_stock, m.rank
+            FROM (
+                SELECT rowid, {RANK} AS rank
+                FROM {TABLE}
+                WHERE {TABLE} MATCH %s {after}
+                ORDER BY rank {direction}, rowid {direction}
+                LIMIT %s
+            ) m
+            JOIN app_product p ON p.id = m.rowid
+            ORDER BY m.rank {direction}, p.id {direction}
+            """,
+            params,
+        )
+    )
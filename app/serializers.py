@@ -1,9 +1,34 @@
-from rest_framework import serializers
+from collections import Counter
 
-from .models import Order, OrderItem, Product
+from django.db import connection, transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import DailyProductSales, Order, OrderItem, Product
+
+
+class ImageVariantsField(serializers.Field):
+    # Product.image_variants as {"thumbnail": url, "medium": url, ...}
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return {
+            name: reverse("product_image", args=[path])
+            for name, path in value.items()
+            if name != "source"
+        }
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    images = ImageVariantsField(source="image_variants")
+    # annotated by Product.objects.with_in_stock()
+    in_stock = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = Product
         fields = (
@@ -12,7 +37,11 @@ class ProductSerializer(serializers.ModelSerializer):
             "description",
             "price",
             "stocks",
+            "in_stock",
+            "images",
         )
+        # stocks for the products loaded without the annotation
+        column_dependencies = {"in_stock": ("stocks",)}
 
     # Field Level validation
     def validate_price(self, value):
@@ -21,11 +50,23 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
 
 
+class ProductImportSerializer(ProductSerializer):
+    # a row of the supplier feed (see the import_products management
+    # command). sku is declared here to leave out the UniqueValidator: an
+    # existing sku is an update, not an error, and checking it would cost
+    # a query per row.
+    sku = serializers.CharField(max_length=64)
+
+    class Meta:
+        model = Product
+        fields = ("sku", "name", "description", "price", "stocks")
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     # product = ProductSerializer()
     product_name = serializers.CharField(source="product.name")
     product_price = serializers.DecimalField(
-        max_digits=10, decimal_places=2, source="product.price"
+        max_digits=10, decimal_places=2, source="unit_price"
     )
     # without this it will display id but once you pass the product serializer
     # it will get the id relevent information will display
@@ -33,6 +74,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = ("product_name", "product_price", "quantity", "item_subtotal")
+        # the columns of the fields that aren't one (see app/fieldsets.py)
+        column_dependencies = {"item_subtotal": ("unit_price", "quantity")}
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -42,9 +85,304 @@ class OrderSerializer(serializers.ModelSerializer):
 
     # def get_total_price(self, obj):
     def total(self, obj):
-        order_items = obj.items.all()
-        return sum(order_item.item_subtotal for order_item in order_items)
+        # stored on the order and maintained by OrderItem.save()/delete()
+        return obj.total_price
 
     class Meta:
         model = Order
         fields = ("order_id", "created_at", "user", "status", "items", "total_price")
+        column_dependencies = {"total_price": ("total_price",)}
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    # an order of users/<id>/orders/, without its items; the counts are
+    # annotated by Order.objects.with_item_counts()
+    item_count = serializers.IntegerField(read_only=True)
+    units = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ("order_id", "created_at", "status", "total_price", "item_count", "units")
+        # annotations, not columns
+        column_dependencies = {"item_count": (), "units": ()}
+
+
+class SpendingSummarySerializer(serializers.Serializer):
+    # the result of Order.objects.spending_summary()
+    lifetime_value = serializers.DecimalField(max_digits=14, decimal_places=2)
+    order_count = serializers.IntegerField()
+    average_order_value = serializers.DecimalField(
+        max_digits=14, decimal_places=2, allow_null=True
+    )
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    # Validates the query parameters of products/ (see app/filters.py);
+    # allow_null, or a missing ?in_stock= would read as false
+    in_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    # Validates the query parameters of orders/ (see app/filters.py)
+    ORDERING_CHOICES = ("created_at", "-created_at", "total_price", "-total_price")
+
+    user = serializers.IntegerField(required=False)
+    status = serializers.ChoiceField(choices=Order.StatusChoices.choices, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    ordering = serializers.ChoiceField(
+        choices=ORDERING_CHOICES, required=False, default="-created_at"
+    )
+
+
+class OrderExportFilterSerializer(serializers.Serializer):
+    # Validates the query parameters of orders/export/ (see app/exports.py);
+    # "output" because DRF reads ?format= itself
+    output = serializers.ChoiceField(choices=("ndjson", "csv"), default="ndjson")
+    layout = serializers.ChoiceField(choices=("nested", "flat"), default="nested")
+    since = serializers.DateTimeField(required=False)
+    gzip = serializers.BooleanField(default=False)
+
+
+class SalesReportFilterSerializer(serializers.Serializer):
+    # Validates the query parameters of reports/sales/ (see app/reports.py)
+    MAX_DAYS = 366 * 10
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    product = serializers.IntegerField(required=False)
+    group_by = serializers.ChoiceField(choices=("day", "product"), default="day")
+    # the best selling products for group_by=product
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+    def validate(self, attrs):
+        days = (attrs["end"] - attrs["start"]).days
+        if days < 0:
+            raise serializers.ValidationError({"end": ["end is before start."]})
+        if days >= self.MAX_DAYS:
+            raise serializers.ValidationError(
+                {"end": [f"A report covers at most {self.MAX_DAYS} days."]}
+            )
+        return attrs
+
+
+class SalesReportRowSerializer(serializers.Serializer):
+    # day or product is missing depending on group_by, order_count is only
+    # there when it counts every order once (see app/reports.py)
+    day = serializers.DateField(required=False)
+    product = serializers.IntegerField(source="product_id", required=False)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    order_count = serializers.IntegerField(required=False)
+
+
+class SalesReportSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    group_by = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    results = SalesReportRowSerializer(many=True)
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Not enough stock."
+    default_code = "out_of_stock"
+
+
+class OrderLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+def merge_lines(lines):
+    # the same product twice is one line with the quantities added up
+    quantities = Counter()
+    for line in lines:
+        quantities[line["product"]] += line["quantity"]
+    return quantities
+
+
+class RejectedOrder:
+    # an order of a bulk upload that didn't pass validation
+    def __init__(self, errors):
+        self.errors = errors
+
+
+class OrderBulkListSerializer(serializers.ListSerializer):
+    """
+    OrderCreateSerializer(many=True), used by POST orders/bulk/.
+
+    An invalid order doesn't fail the whole batch like in a normal
+    ListSerializer, every order gets its own result instead.
+    """
+
+    # rows per INSERT / UPDATE statement
+    batch_size = 1000
+
+    def run_child_validation(self, data):
+        try:
+            return super().run_child_validation(data)
+        except ValidationError as exc:
+            return RejectedOrder(exc.detail)
+
+    def save(self, **kwargs):
+        # ListSerializer.save() would merge kwargs into every order,
+        # including the rejected ones
+        self.instance = self.create(self.validated_data, **kwargs)
+        return self.instance
+
+    def create(self, validated_data, user):
+        """
+        Returns one result per order, in the order they were sent:
+        {"index": 0, "status": "created", "order_id": ...} or
+        {"index": 1, "status": "rejected", "errors": {...}}
+        """
+        orders = [
+            order if isinstance(order, RejectedOrder) else merge_lines(order["items"])
+            for order in validated_data
+        ]
+        product_ids = sorted(
+            {pk for order in orders if isinstance(order, Counter) for pk in order}
+        )
+        results = []
+        created_orders = []  # (order, items)
+        changed = {}
+
+        with transaction.atomic():
+            # Lock the products before reading their stock: a no-op UPDATE
+            # takes SQLite's write lock (and row locks elsewhere) up front,
+            # so no other buyer can change the stock between the read and
+            # the write below. See OrderCreateSerializer.create.
+            # backends without a parameter limit (PostgreSQL) say None
+            batch = connection.features.max_query_params or self.batch_size
+            for start in range(0, len(product_ids), batch):
+                Product.objects.filter(pk__in=product_ids[start : start + batch]).update(
+                    stocks=F("stocks")
+                )
+            # one query (batched by in_bulk) for every product of the upload
+            products = Product.objects.in_bulk(product_ids)
+
+            for index, quantities in enumerate(orders):
+                if isinstance(quantities, RejectedOrder):
+                    results.append(self.rejected(index, quantities.errors))
+                    continue
+                missing = [pk for pk in quantities if pk not in products]
+                if missing:
+                    errors = [f"Product {pk} does not exist." for pk in missing]
+                    results.append(self.rejected(index, {"items": errors}))
+                    continue
+                # the stock left after the orders before this one
+                short = [pk for pk, qty in quantities.items() if products[pk].stocks < qty]
+                if short:
+                    errors = [f"Not enough stock for product {pk}." for pk in short]
+                    results.append(self.rejected(index, {"items": errors}))
+                    continue
+
+                order = Order(user=user)
+                items = []
+                for pk in sorted(quantities):
+                    product = products[pk]
+                    product.stocks -= quantities[pk]
+                    changed[pk] = product
+                    # the ids instead of the instances skip the related
+                    # descriptors, which adds up over 10,000s of items
+                    item = OrderItem(
+                        order_id=order.pk,
+                        product_id=pk,
+                        quantity=quantities[pk],
+                        unit_price=product.price,
+                    )
+                    order.total_price += item.item_subtotal
+                    items.append(item)
+                created_orders.append((order, items))
+                results.append(
+                    {"index": index, "status": "created", "order_id": str(order.pk)}
+                )
+
+            # bulk_create/bulk_update skip OrderItem.save() and auto_now,
+            # so the totals and updated_at are set above and here
+            now = timezone.now()
+            for product in changed.values():
+                product.updated_at = now
+            Order.objects.bulk_create(
+                [order for order, _ in created_orders], batch_size=self.batch_size
+            )
+            OrderItem.objects.bulk_create(
+                [item for _, items in created_orders for item in items],
+                batch_size=self.batch_size,
+            )
+            Product.objects.bulk_update(
+                changed.values(), ["stocks", "updated_at"], batch_size=self.batch_size
+            )
+            # created_at is set by bulk_create()
+            DailyProductSales.objects.record(
+                added=[
+                    line
+                    for order, items in created_orders
+                    for line in DailyProductSales.lines(order, items)
+                ]
+            )
+
+        self.changed_products = sorted(changed)
+        return results
+
+    @staticmethod
+    def rejected(index, errors):
+        return {"index": index, "status": "rejected", "errors": errors}
+
+
+class OrderCreateSerializer(serializers.Serializer):
+    # POST orders/ {"items": [{"product": 1, "quantity": 2}, ...]}
+    items = OrderLineSerializer(many=True, allow_empty=False)
+
+    class Meta:
+        list_serializer_class = OrderBulkListSerializer
+
+    def create(self, validated_data):
+        quantities = merge_lines(validated_data["items"])
+        # always in the same order, so two buyers never wait on each other
+        product_ids = sorted(quantities)
+
+        with transaction.atomic():
+            # Reserve the stock first. Each UPDATE only succeeds if there is
+            # enough left (UPDATE ... WHERE stocks >= qty), so concurrent
+            # buyers can't oversell, and nothing is read and then written
+            # back. Writing first also makes SQLite take the write lock at
+            # the start of the transaction, instead of failing to upgrade a
+            # read snapshot another buyer has already changed.
+            # updated_at too, it is product_detail's Last-Modified
+            now = timezone.now()
+            for product_id in product_ids:
+                reserved = Product.objects.filter(
+                    pk=product_id, stocks__gte=quantities[product_id]
+                ).update(stocks=F("stocks") - quantities[product_id], updated_at=now)
+                if not reserved:
+                    # raising rolls back the reservations made so far
+                    if not Product.objects.filter(pk=product_id).exists():
+                        raise serializers.ValidationError(
+                            {"items": [f"Product {product_id} does not exist."]}
+                        )
+                    raise OutOfStock(f"Not enough stock for product {product_id}.")
+
+            products = Product.objects.in_bulk(product_ids)
+            order = Order(user=validated_data["user"])
+            items = [
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    quantity=quantities[product_id],
+                    unit_price=products[product_id].price,
+                )
+                for product_id in product_ids
+            ]
+            order.total_price = sum(item.item_subtotal for item in items)
+            order.save()
+            OrderItem.objects.bulk_create(items)
+            DailyProductSales.objects.record(added=DailyProductSales.lines(order, items))
+        return order
+
+    def to_representation(self, order):
+        return OrderSerializer(Order.objects.for_listing().get(pk=order.pk)).data
+
@@ -0,0 +1,32 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from app import thumbnails
+from app.models import Product, remove_product_from_totals
+from app.product_cache import invalidate_product
+from app.sqlite import configure_connection
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate_product(instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # before the cascade removes the product's order lines
+    remove_product_from_totals(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def product_image_changed(sender, instance, raw=False, **kwargs):
+    # a new (or removed) image gets its variants made in the background
+    if not raw and thumbnails.needs_variants(instance):
+        thumbnails.schedule(instance.pk)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    configure_connection(connection)
@@ -0,0 +1,34 @@
+from django.conf import settings
+
+
+# SQLite performance profile
+# https://www.sqlite.org/pragma.html
+
+# The pragmas in settings.SQLITE_PRAGMAS are run on every new SQLite
+# connection (see the connection_created handler in app/signals.py):
+
+# journal_mode=WAL    readers don't block the writer and the writer doesn't
+#                     block readers, only writers wait for each other
+# synchronous=NORMAL  with WAL, no fsync on every commit, only at
+#                     checkpoints; still safe against corruption
+# mmap_size           read the database file through memory mapping
+# cache_size          page cache per connection, negative means KiB
+# temp_store=MEMORY   temporary tables and indexes (sorting) in memory
+# busy_timeout        ms to wait for a lock instead of failing at once with
+#                     "database is locked"
+
+# Persistent connections (CONN_MAX_AGE) keep the connection, and the work
+# of setting it up, for the next requests.
+
+
+def pragma_statements(pragmas):
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+def configure_connection(connection):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
@@ -0,0 +1,142 @@
+import io
+import json
+import sys
+import time
+
+START = time.perf_counter()
+
+# Cold start probe, run in a fresh process by the bench_startup command:
+
+#   DJANGO_SETTINGS_MODULE=backend.settings_api python -m app.startup wsgi /products/ [db]
+
+# Imports backend/wsgi.py (or asgi.py) like a server worker does, sends it
+# one request and prints what it measured as JSON:
+
+#   responded_at    time.time() of the first response
+#   boot_ms         importing the entry point (django.setup(), every app)
+#   first_ms        the first request (loads the URLconf, views, DRF)
+#   request_us      a later request, median
+#   bare_us         the same request with MIDDLEWARE = [] (wsgi only)
+
+# Nothing but the standard library is imported before the entry point, so
+# the numbers are the worker's own. `db` replaces the SQLite file of the
+# default database (bench_startup passes its throwaway test database).
+
+REPEAT = 200
+
+
+def environ(path):
+    path, _, query = path.partition("?")
+    return {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+
+def wsgi_request(application, path):
+    status = []
+    body = application(environ(path), lambda s, headers, exc_info=None: status.append(s))
+    b"".join(body)
+    if hasattr(body, "close"):
+        body.close()
+    return int(status[0].split()[0])
+
+
+def asgi_request(application, path):
+    import asyncio
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    messages = []
+
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # the client stays connected, Django stops listening once it has
+        # sent the response
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return messages[0]["status"]
+
+
+def median_us(func, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main(server, path, database=None):
+    if database:
+        # settings are read before the entry point configures anything
+        import os
+
+        from django.conf import settings
+
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+        settings.DATABASES["default"]["NAME"] = database
+    if server == "asgi":
+        from backend.asgi import application
+
+        request = asgi_request
+    else:
+        from backend.wsgi import application
+
+        request = wsgi_request
+    booted = time.perf_counter()
+    status = request(application, path)
+    # wall clock, comparable with the parent process's
+    responded_at = time.time()
+    result = {
+        "responded_at": responded_at,
+        "boot_ms": (booted - START) * 1000,
+        "first_ms": (time.perf_counter() - booted) * 1000,
+        "status": status,
+        "request_us": median_us(lambda: request(application, path)),
+    }
+    if server == "wsgi":
+        # the same handler rebuilt without any middleware
+        from django.conf import settings
+
+        settings.MIDDLEWARE = []
+        application.load_middleware()
+        result["bare_us"] = median_us(lambda: request(application, path))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
@@ -0,0 +1,77 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from app.pagination import query_params
+from app.renderers import FastJSONRenderer
+
+
+# StreamingHttpResponse
+# https://docs.djangoproject.com/en/5.2/ref/request-response/#streaminghttpresponse-objects
+
+# Response(serializer.data) builds every model instance, every serialized
+# dict and the whole JSON document in memory before sending the first byte.
+# Streaming walks the queryset with .iterator(), serializes one chunk of rows
+# at a time and sends it straight away, so memory use stays the same whether
+# the table has a thousand or a million rows.
+
+# The rows are read with the FastReader from app/fast_serializers.py, which
+# produces the same output as the serializers without building model
+# instances. Nested order items are fetched with one query per chunk.
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def wants_stream(request):
+    return query_params(request).get("stream") in ("1", "true")
+
+
+def json_array_chunks(queryset, reader, chunk_size=None):
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    renderer = FastJSONRenderer()
+
+    yield b"["
+    first = True
+    for data in reader.read_chunks(queryset, chunk_size):
+        # render the batch as an array and drop its brackets, so the
+        # output is byte for byte what JSONRenderer gives for the
+        # whole list
+        body = renderer.render(data)[1:-1]
+        if not first:
+            yield b","
+        yield body
+        first = False
+    yield b"]"
+
+
+def stream_json_array(request, queryset, reader, chunk_size=None):
+    chunks = json_array_chunks(queryset, reader, chunk_size)
+    return streaming_response(request, chunks, "application/json")
+
+
+async def _aiter_chunks(chunks):
+    # Under ASGI a sync iterator given to StreamingHttpResponse is read
+    # completely into memory first. Pull one chunk at a time instead, on
+    # the thread that owns the database connection.
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (chunk := await next_chunk(chunks, done)) is not done:
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type):
+    """
+    StreamingHttpResponse for a sync view, sending `chunks` one at a time
+    through backend/wsgi.py and backend/asgi.py alike.
+    """
+    # WSGI would read an async iterator into memory, ASGI a sync one.
+    # A DRF Request wraps Django's.
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        chunks = _aiter_chunks(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+def astream_json_array(queryset, reader, chunk_size=None):
+    chunks = json_array_chunks(queryset, reader, chunk_size)
+    return StreamingHttpResponse(
+        _aiter_chunks(chunks), content_type="application/json"
+    )
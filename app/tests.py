@@ -1,3 +1,1737 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import ModuleType
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import sync_to_async
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.db import IntegrityError, connection, connections
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from app import benchmarks, thumbnails
+from app.fast_serializers import order_reader, product_reader
+from app.filters import filter_orders
+from app.management.commands.bench_startup import import_times, probe
+from app.middleware import query_shape
+from app.models import (
+    ArchivedOrder,
+    DailyProductSales,
+    Order,
+    OrderItem,
+    Product,
+    User,
+)
+from app.pagination import OrderPagination, ProductPagination
+from app.product_cache import cache_stats, get_cache, get_product_entry
+from app.renderers import FastJSONRenderer, MessagePackRenderer
+from app.serializers import OrderSerializer, ProductSerializer
+from app.urls import API_ROUTES, build_urlpatterns
+
+
+def create_orders(user, products, count, items_per_order=2):
+    orders = [Order(user=user) for _ in range(count)]
+    items = []
+    for i, order in enumerate(orders):
+        for j in range(items_per_order):
+            product = products[(i + j) % len(products)]
+            item = OrderItem(
+                order=order, product=product, quantity=j + 1, unit_price=product.price
+            )
+            order.total_price += item.item_subtotal
+            items.append(item)
+    Order.objects.bulk_create(orders)
+    OrderItem.objects.bulk_create(items)
+    return orders
+
+
+class OrderListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(
+                name=f"Product {i}",
+                description="",
+                price=Decimal("10.00") + i,
+                stocks=5,
+            )
+            for i in range(5)
+        )
+
+    def test_query_count_is_constant(self):
+        for count in (10, 10_000):
+            with self.subTest(orders=count):
+                Order.objects.all().delete()
+                create_orders(self.user, self.products, count)
+
+                # 1 query for orders + users, 1 query for items + products
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse("orders"))
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["results"]), min(count, 50))
+
+    def test_total_uses_prefetched_items(self):
+        create_orders(self.user, self.products, 1)
+        order = Order.objects.for_listing().get()
+
+        with self.assertNumQueries(0):
+            total = OrderSerializer(order).data["total_price"]
+
+        self.assertEqual(total, Decimal("10.00") * 1 + Decimal("11.00") * 2)
+
+
+class OrderTotalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.product = Product.objects.create(
+            name="Coffee Machine", description="", price=Decimal("70.99"), stocks=6
+        )
+
+    def test_total_follows_item_changes(self):
+        order = Order.objects.create(user=self.user)
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        self.assertEqual(item.unit_price, Decimal("70.99"))
+        self.assertEqual(order.total_price, Decimal("141.98"))
+
+        item.quantity = 3
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("212.97"))
+
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("0"))
+
+    def test_price_change_keeps_order_history(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+        self.product.price = Decimal("99.99")
+        self.product.save()
+
+        data = OrderSerializer(Order.objects.for_listing().get()).data
+        self.assertEqual(data["total_price"], Decimal("70.99"))
+        self.assertEqual(data["items"][0]["product_price"], "70.99")
+
+    def test_changing_the_product_takes_its_price(self):
+        grinder = Product.objects.create(
+            name="Grinder", description="", price=Decimal("99.00"), stocks=1
+        )
+        order = Order.objects.create(user=self.user)
+        item = OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+        item.product = grinder
+        item.save()
+        self.assertEqual(item.unit_price, Decimal("99.00"))
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("99.00"))
+
+    def test_deleting_a_product_updates_the_totals(self):
+        grinder = Product.objects.create(
+            name="Grinder", description="", price=Decimal("99.00"), stocks=1
+        )
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+        OrderItem.objects.create(order=order, product=grinder, quantity=2)
+        other = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=other, product=grinder, quantity=1)
+
+        self.product.delete()
+        order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("198.00"))
+        self.assertEqual(other.total_price, Decimal("99.00"))
+        self.assertEqual(list(order.items.values_list("product", flat=True)), [grinder.pk])
+
+    def test_recompute_order_totals(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        OrderItem.objects.update(unit_price=None)
+        Order.objects.update(total_price=0)
+
+        call_command("recompute_order_totals", "--check", stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("0"))
+
+        call_command("recompute_order_totals", stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal("141.98"))
+        self.assertEqual(order.items.get().unit_price, Decimal("70.99"))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal("1.00"), stocks=1)
+            for i in range(25)
+        )
+        cls.orders = create_orders(cls.user, cls.products, 25)
+        # same timestamp everywhere, so order_id has to break the ties
+        Order.objects.update(created_at=timezone.now())
+
+    def walk(self, url_name):
+        url = reverse(url_name) + "?page_size=10"
+        seen = []
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data)
+            seen.extend(data["results"])
+            url = data["next"]
+
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]["previous"])
+
+        # walking back from the last page returns the same pages
+        previous = self.client.get(pages[-1]["previous"]).json()
+        self.assertEqual(previous["results"], pages[1]["results"])
+        return seen
+
+    def test_products_are_paginated_by_id(self):
+        seen = self.walk("products")
+        self.assertEqual([p["id"] for p in seen], sorted(p.id for p in self.products))
+
+    def test_orders_are_paginated_by_created_at_and_order_id(self):
+        seen = self.walk("orders")
+        expected = sorted((str(o.order_id) for o in self.orders), reverse=True)
+        self.assertEqual([o["order_id"] for o in seen], expected)
+
+    def test_page_size_is_bounded(self):
+        with mock.patch.object(ProductPagination, "max_page_size", 5):
+            response = self.client.get(reverse("products"), {"page_size": 10_000})
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("orders"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class StreamingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal("1.50"), stocks=1)
+            for i in range(7)
+        )
+        create_orders(cls.user, cls.products, 7)
+
+    def get_stream(self, url_name):
+        response = self.client.get(reverse(url_name), {"stream": 1})
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    @mock.patch("app.streaming.STREAM_CHUNK_SIZE", 3)
+    def test_streamed_products_match_serializer_output(self):
+        body = self.get_stream("products")
+        expected = ProductSerializer(Product.objects.order_by("id"), many=True).data
+        self.assertEqual(body, JSONRenderer().render(expected))
+
+    def test_streamed_orders_prefetch_items_per_chunk(self):
+        # 1 query for the orders, read in chunks of 3, and 1 query for
+        # the items of each chunk
+        with mock.patch("app.streaming.STREAM_CHUNK_SIZE", 3):
+            with self.assertNumQueries(4):
+                body = self.get_stream("orders")
+
+        orders = Order.objects.for_listing().order_by("-created_at", "-order_id")
+        expected = OrderSerializer(orders, many=True).data
+        self.assertEqual(body, JSONRenderer().render(expected))
+
+    def test_empty_stream(self):
+        Product.objects.all().delete()
+        self.assertEqual(self.get_stream("products"), b"[]")
+
+    @mock.patch("app.streaming.STREAM_CHUNK_SIZE", 3)
+    async def test_streams_under_asgi(self):
+        # the sync views hand ASGI an async iterator, a sync one would be
+        # read into memory before the first byte is sent
+        for url_name in ("products", "orders"):
+            with self.subTest(url_name):
+                response = await self.async_client.get(reverse(url_name), {"stream": 1})
+                self.assertTrue(response.is_async)
+                body = b"".join([chunk async for chunk in response.streaming_content])
+                self.assertEqual(body, await sync_to_async(self.get_stream)(url_name))
+
+
+class FastReaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal("12.99"), stocks=i)
+            for i in range(4)
+        )
+        create_orders(cls.user, cls.products, 5, items_per_order=3)
+        # an order without items
+        Order.objects.create(user=cls.user)
+
+    def test_products_match_serializer(self):
+        products = Product.objects.order_by("id")
+        self.assertEqual(
+            JSONRenderer().render(product_reader.read(products)),
+            JSONRenderer().render(ProductSerializer(products, many=True).data),
+        )
+
+    def test_orders_match_serializer(self):
+        orders = Order.objects.for_listing().order_by("-created_at", "-order_id")
+        self.assertEqual(
+            JSONRenderer().render(order_reader.read(orders, chunk_size=2)),
+            JSONRenderer().render(OrderSerializer(orders, many=True).data),
+        )
+
+
+class ProductDetailCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.product = Product.objects.create(
+            name="Watch", description="", price=Decimal("500.05"), stocks=1
+        )
+        self.url = reverse("product_detail", args=[self.product.pk])
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.json()["name"], "Watch")
+        stats = self.client.get(reverse("product_cache_stats")).json()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        last_modified = response["Last-Modified"]
+        response = self.client.get(self.url, headers={"if-modified-since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_and_delete_invalidate(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        self.product.price = Decimal("450.00")
+        self.product.save()
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["price"], "450.00")
+
+        self.product.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(cache_stats()["invalidations"], 3)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = "django.core.cache.backends.filebased.FileBasedCache"
+            caches = {"default": {"BACKEND": backend, "LOCATION": location}}
+            with self.settings(CACHES=caches):
+                self.client.get(self.url)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+async_urls = ModuleType("async_urls")
+async_urls.urlpatterns = build_urlpatterns([name for _, name, *_ in API_ROUTES])
+
+
+class RendererTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            [
+                Product(
+                    name="Café", description="line\u2028break", price=Decimal("3.10"), stocks=0
+                ),
+                Product(name="Tea", description="", price=Decimal("12.00"), stocks=4),
+            ]
+        )
+        create_orders(cls.user, cls.products, 3)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_fast_json_matches_json_renderer(self):
+        orders = Order.objects.for_listing()
+        samples = [
+            OrderSerializer(orders, many=True).data,
+            ProductSerializer(Product.objects.with_in_stock(), many=True).data,
+            {
+                "decimal": Decimal("1.50"),
+                "uuid": uuid.uuid4(),
+                "datetime": timezone.now(),
+                "date": timezone.now().date(),
+                1: "int key",
+                "separators": "\u2028\u2029 ü €",
+            },
+            # too big for orjson, json.dumps() does it
+            {"big": 2**70},
+            [],
+            "",
+        ]
+        for data in samples:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+        media_type = "application/json; indent=2"
+        self.assertEqual(
+            FastJSONRenderer().render(samples[2], media_type),
+            JSONRenderer().render(samples[2], media_type),
+        )
+
+    def test_default_is_json(self):
+        response = self.client.get(reverse("orders"))
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    def test_msgpack_negotiation(self):
+        url = reverse("products")
+        expected = self.client.get(url).json()
+        for response in (
+            self.client.get(url, HTTP_ACCEPT="application/msgpack"),
+            self.client.get(url, {"format": "msgpack"}),
+        ):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], MessagePackRenderer.media_type)
+            self.assertEqual(msgpack.unpackb(response.content), expected)
+
+        response = self.client.get(reverse("orders"), HTTP_ACCEPT="application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data, self.client.get(reverse("orders")).json())
+
+    def test_async_views_negotiate(self):
+        with self.settings(ROOT_URLCONF=async_urls):
+            response = self.client.get(reverse("products"), HTTP_ACCEPT="application/msgpack")
+            expected = self.client.get(reverse("products")).json()
+        self.assertEqual(response["Content-Type"], MessagePackRenderer.media_type)
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_each_format_has_its_own_etag(self):
+        url = reverse("product_detail", args=[self.products[1].pk])
+        msgpack_accept = {"HTTP_ACCEPT": MessagePackRenderer.media_type}
+        for urlconf in (settings.ROOT_URLCONF, async_urls):
+            with self.settings(ROOT_URLCONF=urlconf):
+                json_etag = self.client.get(url)["ETag"]
+                response = self.client.get(url, **msgpack_accept)
+                self.assertNotEqual(response["ETag"], json_etag)
+                self.assertIn("Accept", response["Vary"])
+
+                stale = self.client.get(url, HTTP_IF_NONE_MATCH=json_etag, **msgpack_accept)
+                self.assertEqual(stale.status_code, 200)
+                self.assertEqual(msgpack.unpackb(stale.content)["name"], "Tea")
+                fresh = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response["ETag"], **msgpack_accept
+                )
+                self.assertEqual(fresh.status_code, 304)
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=json_etag).status_code, 304
+                )
+
+    def test_browsable_api(self):
+        response = self.client.get(reverse("products"), HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/html", response["Content-Type"])
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal("3.10"), stocks=i)
+            for i in range(3)
+        )
+        create_orders(cls.user, cls.products, 4)
+
+    def setUp(self):
+        get_cache().clear()
+
+    async def get_both(self, url, **kwargs):
+        sync_response = await sync_to_async(self.client.get)(url, **kwargs)
+        with self.settings(ROOT_URLCONF=async_urls):
+            async_response = await self.async_client.get(url, **kwargs)
+        return sync_response, async_response
+
+    async def content(self, response):
+        if not response.streaming:
+            return response.content
+        if response.is_async:
+            return b"".join([chunk async for chunk in response.streaming_content])
+        # the sync views' streams query the database while being read
+        return await sync_to_async(response.getvalue)()
+
+    async def test_lists_match_sync_views(self):
+        for url_name in ("products", "orders"):
+            for params in ({"page_size": 2}, {"stream": 1}):
+                with self.subTest(url_name, **params):
+                    sync_response, async_response = await self.get_both(
+                        reverse(url_name), query_params=params
+                    )
+                    self.assertEqual(
+                        await self.content(async_response),
+                        await self.content(sync_response),
+                    )
+
+    async def test_product_detail(self):
+        url = reverse("product_detail", args=[self.products[0].pk])
+        sync_response, async_response = await self.get_both(url)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response["ETag"], sync_response["ETag"])
+
+        _, not_modified = await self.get_both(
+            url, headers={"if-none-match": sync_response["ETag"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_errors(self):
+        _, missing = await self.get_both(reverse("product_detail", args=[0]))
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(missing.json(), {"detail": "No Product matches the given query."})
+
+        _, bad_cursor = await self.get_both(reverse("orders"), query_params={"cursor": "x"})
+        self.assertEqual(bad_cursor.status_code, 404)
+
+        with self.settings(ROOT_URLCONF=async_urls):
+            response = await self.async_client.post(reverse("products"))
+        self.assertEqual(response.status_code, 405)
+
+
+class PopulateDbTests(TestCase):
+    def populate(self):
+        out = StringIO()
+        call_command(
+            "populate_db",
+            "--products=20",
+            "--users=5",
+            "--orders=30",
+            "--items-per-order=4",
+            "--batch-size=7",
+            stdout=out,
+        )
+        # {"products": rows created, ...}
+        return {line.split()[0]: int(line.split()[1]) for line in out.getvalue().splitlines()}
+
+    def test_populate_is_idempotent(self):
+        self.populate()
+        counts = (Product.objects.count(), Order.objects.count(), OrderItem.objects.count())
+        created = self.populate()
+        self.assertEqual(
+            [created[label] for label in ("products", "users", "orders")], [0, 0, 0]
+        )
+
+        self.assertEqual(
+            (Product.objects.count(), Order.objects.count(), OrderItem.objects.count()),
+            counts,
+        )
+        self.assertEqual(counts[:2], (20, 30))
+        self.assertEqual(User.objects.count(), 6)
+
+    def test_orders_are_consistent(self):
+        self.populate()
+        out = StringIO()
+        call_command("recompute_order_totals", "--check", stdout=out)
+        self.assertIn("Found 0 wrong totals", out.getvalue())
+        # dates are spread out instead of all being "now"
+        self.assertGreater(
+            Order.objects.filter(created_at__lt=timezone.now() - timedelta(days=30)).count(),
+            0,
+        )
+
+
+class APIBenchmarkTests(TestCase):
+    def test_tiny_scale_is_within_budget(self):
+        results = benchmarks.run(["tiny"], requests=20, client=self.client)
+
+        self.assertEqual(set(results["tiny"]), {"products", "product_detail", "orders"})
+        for result in results["tiny"].values():
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+        self.assertEqual(benchmarks.over_budget(results), [])
+
+    def test_over_budget(self):
+        results = {"tiny": {"orders": {"queries": 3, "p95_ms": 10}}}
+        self.assertEqual(
+            benchmarks.over_budget(results),
+            ["tiny/orders: queries is 3, budget 2"],
+        )
+
+    def test_percentile(self):
+        timings = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(timings, 50), 50)
+        self.assertEqual(benchmarks.percentile(timings, 99), 99)
+
+
+@override_settings(
+    REQUEST_INSTRUMENTATION={
+        "ENABLED": True,
+        "SLOW_REQUEST_MS": 0,
+        "N_PLUS_ONE_THRESHOLD": 3,
+    }
+)
+class RequestInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal("2.00"), stocks=1)
+            for i in range(5)
+        )
+        create_orders(cls.user, cls.products, 5)
+
+    def test_server_timing_header(self):
+        with self.assertLogs("app.instrumentation", "WARNING") as logs:
+            response = self.client.get(reverse("orders"))
+
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", 'desc="2 queries"', "view;dur=", "serialize;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        self.assertIn("Slow request GET /orders/", logs.output[0])
+
+    def test_n_plus_one_is_logged(self):
+        without_prefetch = mock.Mock(return_value=Order.objects.all())
+        with mock.patch.object(Order.objects, "for_listing", without_prefetch):
+            with self.assertLogs("app.instrumentation", "WARNING") as logs:
+                self.client.get(reverse("orders"))
+
+        self.assertTrue(any("Possible N+1" in line for line in logs.output))
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            query_shape('SELECT * FROM "t" WHERE "id" IN (%s)'),
+        )
+
+    @override_settings(REQUEST_INSTRUMENTATION={"ENABLED": False})
+    def test_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("products")))
+
+
+class OrderFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", password="test")
+        cls.bob = User.objects.create_user(username="bob", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal(i + 1), stocks=1)
+            for i in range(3)
+        )
+        create_orders(cls.alice, cls.products, 4)
+        create_orders(cls.bob, cls.products, 2)
+        old = timezone.now() - timedelta(days=100)
+        Order.objects.filter(user=cls.bob).update(
+            created_at=old, status=Order.StatusChoices.DELIVERED
+        )
+        cls.old = old
+
+    def get_ids(self, **params):
+        response = self.client.get(reverse("orders"), params)
+        self.assertEqual(response.status_code, 200)
+        return [order["order_id"] for order in response.json()["results"]]
+
+    def expected(self, queryset):
+        return [str(pk) for pk in queryset.values_list("pk", flat=True)]
+
+    def test_filters(self):
+        bob = Order.objects.filter(user=self.bob).order_by("-created_at", "-order_id")
+        self.assertEqual(self.get_ids(user=self.bob.pk), self.expected(bob))
+        self.assertEqual(self.get_ids(status="Delivered"), self.expected(bob))
+        self.assertEqual(
+            self.get_ids(created_before=(self.old + timedelta(days=1)).isoformat()),
+            self.expected(bob),
+        )
+        self.assertEqual(
+            len(self.get_ids(created_after=(self.old + timedelta(days=1)).isoformat())), 4
+        )
+
+    def test_ordering_with_pagination(self):
+        by_total = Order.objects.order_by("total_price", "order_id")
+        seen = []
+        url = reverse("orders") + "?ordering=total_price&page_size=4"
+        while url:
+            data = self.client.get(url).json()
+            seen += [order["order_id"] for order in data["results"]]
+            url = data["next"]
+        self.assertEqual(seen, self.expected(by_total))
+
+    def test_invalid_parameters(self):
+        for params in ({"status": "Lost"}, {"ordering": "user"}, {"created_after": "soon"}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(reverse("orders"), params).status_code, 400)
+
+    def test_filters_use_indexes(self):
+        after = "2025-01-01T00:00:00Z"
+        cases = [
+            {"user": 1},
+            {"status": "Pending"},
+            {"created_after": after},
+            {"created_after": after, "created_before": "2025-06-01T00:00:00Z"},
+            {"user": 1, "status": "Pending"},
+            {"user": 1, "ordering": "created_at"},
+        ]
+        for params in cases:
+            with self.subTest(**params):
+                request = RequestFactory().get("/orders/", params)
+                orders, ordering = filter_orders(Order.objects.all(), request)
+                page = OrderPagination(ordering).page_queryset(orders, request)
+                plan = page.explain()
+
+                self.assertRegex(plan, r"SEARCH app_order USING (COVERING )?INDEX")
+                self.assertNotRegex(plan, r"SCAN app_order(?! USING)")
+
+    def test_one_line_per_product(self):
+        order = Order.objects.filter(user=self.alice).first()
+        with self.assertRaises(IntegrityError):
+            OrderItem.objects.create(order=order, product=order.items.first().product, quantity=1)
+
+
+class SQLitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        # 1 is NORMAL, 2 is MEMORY
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("temp_store"), 2)
+        self.assertEqual(self.pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+
+    def test_wal_on_file_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = connections["default"].__class__(
+                {**connection.settings_dict, "NAME": f"{directory}/wal.sqlite3"},
+                alias="wal",
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+            finally:
+                wrapper.close()
+
+
+class OrderCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="alice", password="test")
+        cls.camera = Product.objects.create(
+            name="Camera", description="", price=Decimal("350.99"), stocks=3
+        )
+        cls.watch = Product.objects.create(
+            name="Watch", description="", price=Decimal("500.05"), stocks=1
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, *lines):
+        items = [{"product": product.pk, "quantity": qty} for product, qty in lines]
+        return self.client.post(reverse("orders"), {"items": items}, format="json")
+
+    def test_creates_order_and_reserves_stock(self):
+        response = self.post((self.camera, 2), (self.watch, 1))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(str(response.json()["total_price"])), Decimal("1202.03"))
+        self.assertEqual(len(response.json()["items"]), 2)
+        order = Order.objects.get(pk=response.json()["order_id"])
+        self.assertEqual(order.user, self.user)
+        self.assertEqual(order.total_price, Decimal("1202.03"))
+        self.camera.refresh_from_db()
+        self.watch.refresh_from_db()
+        self.assertEqual((self.camera.stocks, self.watch.stocks), (1, 0))
+
+    def test_duplicate_lines_are_merged(self):
+        response = self.post((self.camera, 1), (self.camera, 2))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["items"][0]["quantity"], 3)
+        self.camera.refresh_from_db()
+        self.assertEqual(self.camera.stocks, 0)
+
+    def test_out_of_stock_changes_nothing(self):
+        response = self.post((self.camera, 1), (self.watch, 2))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        self.camera.refresh_from_db()
+        self.assertEqual(self.camera.stocks, 3)
+
+    def test_unknown_product(self):
+        response = self.client.post(
+            reverse("orders"),
+            {"items": [{"product": 999, "quantity": 1}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_authentication(self):
+        response = APIClient().post(
+            reverse("orders"),
+            {"items": [{"product": self.camera.pk, "quantity": 1}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalidates_cached_product(self):
+        url = reverse("product_detail", args=[self.camera.pk])
+        self.assertEqual(self.client.get(url).json()["stocks"], 3)
+        self.post((self.camera, 1))
+        self.assertEqual(self.client.get(url).json()["stocks"], 2)
+
+    def test_changes_last_modified(self):
+        # Last-Modified has a resolution of one second
+        Product.objects.filter(pk=self.watch.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        url = reverse("product_detail", args=[self.watch.pk])
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.post((self.watch, 1))
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stocks"], 0)
+        self.assertFalse(response.json()["in_stock"])
+
+
+class OrderCreateStressTests(TransactionTestCase):
+    # real commits from many threads, every thread has its own connection
+    def test_no_overselling(self):
+        users = [User.objects.create_user(username=f"buyer{i}") for i in range(5)]
+        product = Product.objects.create(
+            name="Hot product", description="", price=Decimal("9.99"), stocks=20
+        )
+        with self.assertLogs("django.request", "WARNING"):
+            result = benchmarks.checkout_stress(product, users, buyers=60, threads=12)
+
+        self.assertEqual(result["created"], 20)
+        self.assertEqual(result["out_of_stock"], 40)
+        self.assertEqual(result["stocks_after"], 0)
+        self.assertEqual(Order.objects.count(), 20)
+
+
+class OrderBulkCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.partner = User.objects.create_user(username="partner", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal(i + 1), stocks=5)
+            for i in range(3)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.partner)
+
+    def post(self, orders):
+        return self.client.post(reverse("orders_bulk"), orders, format="json")
+
+    def order(self, *lines):
+        return {"items": [{"product": p.pk, "quantity": qty} for p, qty in lines]}
+
+    def test_creates_orders_in_constant_queries(self):
+        one, two, three = self.products
+        orders = [self.order((one, 1), (two, 1)) for _ in range(2)]
+        # savepoint, lock, products, orders, items, stocks, sales rollup,
+        # release
+        with self.assertNumQueries(8):
+            self.post(orders)
+        with self.assertNumQueries(8):
+            response = self.post(orders + [self.order((three, 1))])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], 3)
+        self.assertEqual(Order.objects.filter(user=self.partner).count(), 5)
+        order = Order.objects.get(pk=response.json()["results"][2]["order_id"])
+        self.assertEqual(order.total_price, Decimal(3))
+        self.assertEqual(order.items.get().unit_price, Decimal(3))
+        stocks = dict(Product.objects.values_list("pk", "stocks"))
+        self.assertEqual(stocks, {one.pk: 1, two.pk: 1, three.pk: 4})
+
+    def test_results_per_order(self):
+        one, two, _ = self.products
+        response = self.post(
+            [
+                self.order((one, 2)),
+                {"items": []},
+                self.order((one, 4)),  # only 3 left after the first order
+                {"items": [{"product": 999, "quantity": 1}]},
+                self.order((two, 1), (two, 1)),
+            ]
+        )
+
+        body = response.json()
+        self.assertEqual((body["created"], body["rejected"]), (2, 3))
+        statuses = [result["status"] for result in body["results"]]
+        self.assertEqual(
+            statuses, ["created", "rejected", "rejected", "rejected", "created"]
+        )
+        self.assertIn("items", body["results"][1]["errors"])
+        self.assertEqual(
+            body["results"][2]["errors"],
+            {"items": [f"Not enough stock for product {one.pk}."]},
+        )
+        self.assertEqual(
+            body["results"][3]["errors"], {"items": ["Product 999 does not exist."]}
+        )
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.get(product=two).quantity, 2)
+
+    def test_all_rejected_without_a_parameter_limit(self):
+        # like PostgreSQL, no product is locked when every order is invalid
+        with mock.patch.object(connection.features, "max_query_params", None):
+            response = self.post([{"items": []}, {"items": []}])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["created"], body["rejected"]), (0, 2))
+
+    @override_settings(BULK_ORDERS_MAX=2)
+    def test_batch_size_limit(self):
+        response = self.post([self.order((self.products[0], 1))] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_requires_authentication(self):
+        response = APIClient().post(
+            reverse("orders_bulk"), [self.order((self.products[0], 1))], format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.machine = Product.objects.create(
+            name="Coffee Machine", description="Makes espresso.", price=70, stocks=1
+        )
+        cls.beans = Product.objects.create(
+            name="Beans", description="Roasted for a coffee machine.", price=9, stocks=1
+        )
+        cls.camera = Product.objects.create(
+            name="Digital Camera", description="Café photos.", price=350, stocks=1
+        )
+
+    def search(self, q, **params):
+        response = self.client.get(reverse("product_search"), {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def names(self, q):
+        return [product["name"] for product in self.search(q)["results"]]
+
+    def test_ranked_prefix_search(self):
+        # a match in the name ranks above one in the description
+        self.assertEqual(self.names("coff mach"), ["Coffee Machine", "Beans"])
+        self.assertEqual(self.names("cafe"), ["Digital Camera"])
+        self.assertEqual(self.names("teapot"), [])
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            self.search("coffee")
+
+    def test_operators_are_words(self):
+        self.assertEqual(self.names('coffee AND "NEAR( -machine'), [])
+        response = self.client.get(reverse("product_search"), {"q": " ?! "})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_writes(self):
+        Product.objects.filter(pk=self.camera.pk).update(name="Coffee Grinder")
+        Product.objects.filter(pk=self.machine.pk).update(stocks=5)
+        self.beans.delete()
+        Product.objects.bulk_create(
+            [Product(name="Coffee Mug", description="", price=5, stocks=1)]
+        )
+        self.assertEqual(
+            sorted(self.names("coffee")),
+            ["Coffee Grinder", "Coffee Machine", "Coffee Mug"],
+        )
+
+    def test_pagination(self):
+        first = self.search("coffee", page_size=1)
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(
+            [first["results"][0]["name"], second["results"][0]["name"]],
+            ["Coffee Machine", "Beans"],
+        )
+        self.assertIsNone(second["next"])
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_rebuild_command(self):
+        call_command("rebuild_search_index", "--drop", stdout=StringIO())
+        self.assertEqual(self.names("machine"), ["Coffee Machine", "Beans"])
+        Product.objects.create(name="Machine Oil", description="", price=3, stocks=1)
+        self.assertIn("Machine Oil", self.names("machine"))
+
+
+class UserOrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice", password="test")
+        cls.bob = User.objects.create_user(username="bob", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=Decimal(i + 1), stocks=1)
+            for i in range(3)
+        )
+        # totals 5, 8, 5, 5
+        cls.orders = create_orders(cls.alice, cls.products, 4)
+        Order.objects.filter(pk=cls.orders[1].pk).update(
+            status=Order.StatusChoices.CANCELED
+        )
+        create_orders(cls.bob, cls.products, 2)
+
+    def get(self, user, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse("user_orders", args=[user.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_summary_excludes_canceled_orders(self):
+        summary = self.get(self.alice)["summary"]
+        self.assertEqual(
+            summary,
+            {"lifetime_value": "15.00", "order_count": 3, "average_order_value": "5.00"},
+        )
+
+    def test_orders_with_item_counts(self):
+        results = self.get(self.alice)["results"]
+        self.assertEqual(len(results), 4)
+        self.assertEqual({order["item_count"] for order in results}, {2})
+        self.assertEqual({order["units"] for order in results}, {3})
+        self.assertEqual(
+            {order["order_id"] for order in results},
+            {str(order.pk) for order in self.orders},
+        )
+
+    def test_query_count(self):
+        # the session, the signed in user, the summary aggregates (live and
+        # archived orders) and the page
+        self.client.force_login(self.alice)
+        url = reverse("user_orders", args=[self.alice.pk])
+        with self.assertNumQueries(5):
+            self.client.get(url, {"page_size": 2})
+
+    def test_user_without_orders(self):
+        carol = User.objects.create_user(username="carol")
+        data = self.get(carol)
+        self.assertEqual(data["results"], [])
+        self.assertEqual(
+            data["summary"],
+            {"lifetime_value": "0.00", "order_count": 0, "average_order_value": None},
+        )
+
+    def test_unknown_user(self):
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        response = self.client.get(reverse("user_orders", args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_the_user_and_staff(self):
+        url = reverse("user_orders", args=[self.alice.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 4)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="alice", password="test")
+        cls.admin = User.objects.create_superuser(username="finance", password="test")
+        cls.camera = Product.objects.create(
+            name="Camera", description="", price=Decimal("100.00"), stocks=100
+        )
+        cls.watch = Product.objects.create(
+            name="Watch", description="", price=Decimal("50.00"), stocks=100
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def place(self, *lines):
+        items = [{"product": p.pk, "quantity": qty} for p, qty in lines]
+        response = self.client.post(reverse("orders"), {"items": items}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.json()["order_id"])
+
+    def rollup(self):
+        return {
+            row.product_id: (row.units, row.revenue, row.order_count)
+            for row in DailyProductSales.objects.filter(day=timezone.localdate())
+        }
+
+    def test_orders_are_recorded(self):
+        self.place((self.camera, 2), (self.watch, 1))
+        self.place((self.camera, 1))
+        self.client.post(
+            reverse("orders_bulk"),
+            [{"items": [{"product": self.watch.pk, "quantity": 3}]}],
+            format="json",
+        )
+        self.assertEqual(
+            self.rollup(),
+            {
+                self.camera.pk: (3, Decimal("300.00"), 2),
+                self.watch.pk: (4, Decimal("200.00"), 2),
+            },
+        )
+
+    def test_cancel_and_restore(self):
+        order = self.place((self.camera, 2))
+        self.place((self.camera, 1))
+
+        order.status = Order.StatusChoices.CANCELED
+        order.save()
+        self.assertEqual(self.rollup(), {self.camera.pk: (1, Decimal("100.00"), 1)})
+
+        order.status = Order.StatusChoices.PENDING
+        order.save()
+        self.assertEqual(self.rollup(), {self.camera.pk: (3, Decimal("300.00"), 2)})
+
+    def test_item_changes_and_delete(self):
+        order = self.place((self.camera, 2), (self.watch, 1))
+        item = order.items.get(product=self.camera)
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self.rollup()[self.camera.pk], (5, Decimal("500.00"), 1))
+
+        order.items.get(product=self.watch).delete()
+        self.assertEqual(self.rollup()[self.watch.pk], (0, Decimal("0.00"), 0))
+
+        Order.objects.get(pk=order.pk).delete()
+        self.assertEqual(self.rollup()[self.camera.pk], (0, Decimal("0.00"), 0))
+
+    def test_rebuild_matches_incremental(self):
+        self.place((self.camera, 2), (self.watch, 1))
+        canceled = self.place((self.watch, 2))
+        canceled.status = Order.StatusChoices.CANCELED
+        canceled.save()
+        incremental = self.rollup()
+
+        DailyProductSales.objects.all().delete()
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+    def report(self, **params):
+        self.client.force_authenticate(self.admin)
+        return self.client.get(reverse("sales_report"), params)
+
+    def test_report(self):
+        today = timezone.localdate()
+        yesterday = today - timedelta(days=1)
+        DailyProductSales.objects.bulk_create(
+            DailyProductSales(
+                day=day, product=product, units=units, revenue=revenue, order_count=orders
+            )
+            for day, product, units, revenue, orders in [
+                (yesterday, self.camera, 1, 100, 1),
+                (today, self.camera, 2, 200, 2),
+                (today, self.watch, 6, 300, 2),
+            ]
+        )
+        with self.assertNumQueries(2):
+            data = self.report(start=yesterday, end=today).json()
+        self.assertEqual((data["units"], data["revenue"]), (9, "600.00"))
+        self.assertEqual(
+            data["results"],
+            [
+                {"day": str(yesterday), "units": 1, "revenue": "100.00"},
+                {"day": str(today), "units": 8, "revenue": "500.00"},
+            ],
+        )
+
+        data = self.report(start=today, end=today, product=self.camera.pk).json()
+        self.assertEqual(
+            data["results"],
+            [{"day": str(today), "units": 2, "revenue": "200.00", "order_count": 2}],
+        )
+
+        data = self.report(start=yesterday, end=today, group_by="product").json()
+        self.assertEqual(
+            data["results"],
+            [
+                # same revenue, the product id breaks the tie
+                {"product": self.camera.pk, "units": 3, "revenue": "300.00", "order_count": 3},
+                {"product": self.watch.pk, "units": 6, "revenue": "300.00", "order_count": 2},
+            ],
+        )
+
+    def test_report_validation_and_permissions(self):
+        today = timezone.localdate()
+        self.assertEqual(self.report(start=today).status_code, 400)
+        self.assertEqual(
+            self.report(start=today, end=today - timedelta(days=1)).status_code, 400
+        )
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("sales_report"), {"start": today, "end": today})
+        self.assertEqual(response.status_code, 403)
+
+
+def image_upload(name="camera.png", size=(1600, 1200), mode="RGBA"):
+    buffer = BytesIO()
+    Image.new(mode, size, "red").save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, THUMBNAIL_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                name="Camera", description="", price=350, stocks=1, **kwargs
+            )
+
+    def test_variants_are_made_and_served(self):
+        product = self.create(image=image_upload())
+        product.refresh_from_db()
+        self.assertEqual(
+            set(product.image_variants), {"source", "thumbnail", "medium", "webp"}
+        )
+
+        images = self.client.get(reverse("product_detail", args=[product.pk])).json()[
+            "images"
+        ]
+        expected = {"thumbnail": ("JPEG", 200), "medium": ("JPEG", 800), "webp": ("WEBP", 800)}
+        for name, (image_format, width) in expected.items():
+            response = self.client.get(images[name])
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("immutable", response["Cache-Control"])
+            with Image.open(BytesIO(b"".join(response.streaming_content))) as image:
+                self.assertEqual(image.format, image_format)
+                self.assertEqual(image.width, width)
+
+    def test_new_image_replaces_variants(self):
+        product = self.create(image=image_upload())
+        product.refresh_from_db()
+        old = product.image_variants["thumbnail"]
+
+        product.image = image_upload("other.png", size=(300, 900), mode="RGB")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        self.assertNotEqual(product.image_variants["thumbnail"], old)
+        self.assertEqual(self.client.get(reverse("product_image", args=[old])).status_code, 404)
+
+    def test_no_work_without_a_new_image(self):
+        with mock.patch("app.thumbnails.render_variants") as render:
+            product = self.create()
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+        render.assert_not_called()
+        self.assertEqual(
+            self.client.get(reverse("product_detail", args=[product.pk])).json()["images"],
+            {},
+        )
+
+    def test_new_variants_change_last_modified(self):
+        with mock.patch("app.thumbnails.schedule"):
+            product = self.create(image=image_upload())
+        # Last-Modified has a resolution of one second
+        Product.objects.filter(pk=product.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        url = reverse("product_detail", args=[product.pk])
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        thumbnails.render_variants(product.pk)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("thumbnail", response.json()["images"])
+
+    def test_only_variants_are_served(self):
+        self.create(image=image_upload())
+        for name in ["products/camera.png", "products/variants/../camera.png", "x.jpg"]:
+            response = self.client.get(reverse("product_image", args=[name]))
+            self.assertEqual(response.status_code, 404, name)
+
+    def test_backfill_command(self):
+        product = self.create(image=image_upload())
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+
+        out = StringIO()
+        call_command("generate_product_images", "--workers=1", stdout=out)
+        self.assertIn("variants of 1 images", out.getvalue())
+        product.refresh_from_db()
+        self.assertIn("thumbnail", product.image_variants)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="alice", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="x" * 1000, price=i + 1, stocks=5)
+            for i in range(3)
+        )
+        create_orders(cls.user, cls.products, 3)
+
+    def get(self, name, args=(), **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(name, args=args), params)
+        return response, " ".join(query["sql"] for query in captured)
+
+    def test_products_only_load_the_fields(self):
+        response, sql = self.get("products", fields="id,name")
+        self.assertEqual(
+            response.json()["results"][0], {"id": self.products[0].pk, "name": "Product 0"}
+        )
+        self.assertNotIn('"description"', sql)
+
+        response, sql = self.get("products", exclude="description,images")
+        self.assertEqual(
+            list(response.json()["results"][0]),
+            ["id", "name", "price", "stocks", "in_stock"],
+        )
+        self.assertNotIn('"description"', sql)
+
+    def test_nested_order_items(self):
+        response, sql = self.get("orders", fields="order_id,items.quantity")
+        order = response.json()["results"][0]
+        self.assertEqual(list(order), ["order_id", "items"])
+        self.assertCountEqual(order["items"], [{"quantity": 1}, {"quantity": 2}])
+        # the products aren't joined when no product field is asked for
+        self.assertNotIn('"app_product"', sql)
+        self.assertIn("next", response.json())
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("orders"), {"exclude": "items"})
+        self.assertNotIn("items", response.json()["results"][0])
+
+        response, sql = self.get("orders", fields="items.product_name,items.item_subtotal")
+        items = [item for order in response.json()["results"] for item in order["items"]]
+        self.assertIn({"product_name": "Product 1", "item_subtotal": 4.0}, items)
+        self.assertEqual(set(items[0]), {"product_name", "item_subtotal"})
+        self.assertNotIn('"description"', sql)
+
+    def test_pagination_with_fields(self):
+        first, _ = self.get("orders", fields="status", page_size=2)
+        second = self.client.get(first.json()["next"]).json()
+        self.assertEqual(len(first.json()["results"]) + len(second["results"]), 3)
+
+    def test_streaming_and_detail(self):
+        response = self.client.get(reverse("products"), {"stream": 1, "fields": "name"})
+        self.assertEqual(b"".join(response.streaming_content)[:21], b'[{"name":"Product 0"}')
+
+        response, _ = self.get("product_detail", args=[self.products[0].pk], fields="price")
+        self.assertEqual(response.json(), {"price": "1.00"})
+
+    def test_unknown_fields(self):
+        for params in (
+            {"fields": "name,colour"},
+            {"exclude": "items.colour"},
+            {"fields": "status.x"},
+        ):
+            response = self.client.get(reverse("orders"), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("Unknown fields", response.json()["fields"][0])
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+
+    def run_import(self, name, content, *args):
+        path = self.dir / name
+        path.write_text(content)
+        out = StringIO()
+        call_command("import_products", str(path), *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_upsert(self):
+        existing = Product.objects.create(
+            sku="A-1", name="Old name", description="Old.", price=5, stocks=1
+        )
+        get_product_entry(existing.pk)
+        out = self.run_import(
+            "feed.csv",
+            "sku,name,description,price,stocks\n"
+            "A-1,Coffee Grinder,Burr grinder.,49.90,7\n"
+            'B-2,Teapot,"Glass, 1 l.",19.00,3\n'
+            "C-3,Broken,Free.,0,1\n",
+            "--batch-size=2",
+        )
+        self.assertIn("3 rows", out)
+        self.assertIn("1 created, 1 updated, 1 rejected", out)
+
+        existing.refresh_from_db()
+        self.assertEqual(
+            (existing.name, existing.price, existing.stocks),
+            ("Coffee Grinder", Decimal("49.90"), 7),
+        )
+        self.assertEqual(Product.objects.get(sku="B-2").description, "Glass, 1 l.")
+        self.assertFalse(Product.objects.filter(sku="C-3").exists())
+        # the cached product and the search index follow the import
+        self.assertEqual(get_product_entry(existing.pk)["data"]["name"], "Coffee Grinder")
+        response = self.client.get(reverse("product_search"), {"q": "grinder"})
+        self.assertEqual([p["name"] for p in response.json()["results"]], ["Coffee Grinder"])
+
+        rejects = (self.dir / "feed.csv.rejects.ndjson").read_text().splitlines()
+        self.assertEqual(
+            json.loads(rejects[0]),
+            {
+                "line": 4,
+                "errors": {"price": ["Price must be greater than 0."]},
+                "row": {
+                    "sku": "C-3",
+                    "name": "Broken",
+                    "description": "Free.",
+                    "price": "0",
+                    "stocks": "1",
+                },
+            },
+        )
+
+    def test_ndjson(self):
+        out = self.run_import(
+            "feed.ndjson",
+            '{"sku": "A-1", "name": "Mug", "description": "Blue.", "price": "4.50", "stocks": 2}\n'
+            "\n"
+            "{not json\n"
+            '{"sku": "A-1", "name": "Mug", "description": "Red.", "price": "4.50", "stocks": 3}\n'
+            '{"sku": "A-2", "name": "Mug"}\n',
+        )
+        self.assertIn("1 created, 0 updated, 2 rejected", out)
+        self.assertEqual(Product.objects.get(sku="A-1").description, "Red.")
+        errors = [
+            json.loads(line)
+            for line in (self.dir / "feed.ndjson.rejects.ndjson").read_text().splitlines()
+        ]
+        self.assertEqual([error["line"] for error in errors], [3, 5])
+        self.assertIn("Invalid JSON", errors[0]["errors"]["non_field_errors"][0])
+        self.assertEqual(set(errors[1]["errors"]), {"description", "price", "stocks"})
+
+    def test_unknown_format(self):
+        with self.assertRaises(CommandError):
+            self.run_import("feed.xml", "<products/>")
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=i + 1, stocks=5)
+            for i in range(3)
+        )
+        cls.orders = create_orders(cls.admin, cls.products, 5)
+        # the oldest order has no items
+        cls.empty = Order.objects.create(user=cls.admin)
+        Order.objects.filter(pk=cls.empty.pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+    def export(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("orders_export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    @mock.patch("app.exports.EXPORT_CHUNK_SIZE", 2)
+    async def test_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse("orders_export"), {"gzip": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        _, expected = await sync_to_async(self.export)()
+        self.assertEqual(gzip.decompress(body), expected)
+
+    def test_nested_ndjson(self):
+        with mock.patch("app.exports.EXPORT_CHUNK_SIZE", 2):
+            response, body = self.export()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="orders.ndjson"', response["Content-Disposition"])
+        orders = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(orders), 6)
+        # oldest first
+        self.assertEqual(orders[0]["order_id"], str(self.empty.pk))
+        self.assertEqual(orders[0]["items"], [])
+        order = Order.objects.for_listing().get(pk=orders[1]["order_id"])
+        expected = OrderSerializer(order).data
+        self.assertEqual(orders[1], json.loads(JSONRenderer().render(expected)))
+
+    def test_flat_csv_gzip_since(self):
+        since = timezone.now() - timedelta(days=1)
+        response, body = self.export(output="csv", gzip=1, since=since.isoformat())
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = list(csv.DictReader(StringIO(gzip.decompress(body).decode())))
+        # 5 orders of 2 items, without the old empty order
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(
+            list(rows[0]),
+            [
+                "order_id",
+                "created_at",
+                "user",
+                "status",
+                "total_price",
+                "product_name",
+                "product_price",
+                "quantity",
+                "item_subtotal",
+            ],
+        )
+        self.assertEqual({row["quantity"] for row in rows}, {"1", "2"})
+        for row in rows:
+            # two places like product_price, not SQLite's 2.00000000000000
+            subtotal = Decimal(row["product_price"]) * int(row["quantity"])
+            self.assertEqual(row["item_subtotal"], str(subtotal))
+
+    def test_flat_ndjson_keeps_orders_without_items(self):
+        _, body = self.export(layout="flat")
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[0]["order_id"], str(self.empty.pk))
+        self.assertNotIn("quantity", rows[0])
+
+    def test_admin_only_and_validation(self):
+        self.assertEqual(self.client.get(reverse("orders_export")).status_code, 403)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("orders_export"), {"output": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "orders.csv.gz"
+            err = StringIO()
+            call_command("export_orders", "--format=csv", f"--output={path}", stderr=err)
+            lines = gzip.decompress(path.read_bytes()).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 10 + 1)
+        self.assertIn("6 orders", err.getvalue())
+        self.assertIn("peak RSS", err.getvalue())
+
+
+class InStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=1, stocks=i % 2)
+            for i in range(6)
+        )
+
+    def names(self, **params):
+        response = self.client.get(reverse("products"), params)
+        self.assertEqual(response.status_code, 200)
+        return [(p["name"], p["in_stock"]) for p in response.json()["results"]]
+
+    def test_filter(self):
+        with CaptureQueriesContext(connection) as captured:
+            names = self.names(in_stock="true")
+        self.assertEqual(
+            names, [("Product 1", True), ("Product 3", True), ("Product 5", True)]
+        )
+        # decided by the database, in the form the partial index covers
+        self.assertEqual(len(captured), 1)
+        self.assertIn('"app_product"."stocks" > 0', captured[0]["sql"])
+
+        self.assertEqual(
+            [in_stock for _, in_stock in self.names(in_stock="false")], [False] * 3
+        )
+        self.assertEqual(len(self.names()), 6)
+        response = self.client.get(reverse("products"), {"in_stock": "maybe"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_annotation(self):
+        product = Product.objects.with_in_stock().get(pk=self.products[1].pk)
+        self.assertIs(product.in_stock, True)
+        # without the annotation the property still works
+        self.assertIs(Product.objects.get(pk=self.products[0].pk).in_stock, False)
+
+        detail = self.client.get(reverse("product_detail", args=[self.products[1].pk]))
+        self.assertIs(detail.json()["in_stock"], True)
+        search = self.client.get(reverse("product_search"), {"q": "product"}).json()
+        self.assertEqual([p["in_stock"] for p in search["results"]], [False, True] * 3)
+        stream = self.client.get(reverse("products"), {"stream": 1, "in_stock": "true"})
+        body = b"".join(stream.streaming_content)
+        expected = ProductSerializer(
+            Product.objects.with_in_stock().in_stock().order_by("id"), many=True
+        ).data
+        self.assertEqual(body, JSONRenderer().render(expected))
+
+    def test_partial_index_is_used(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        plan = Product.objects.in_stock().order_by("id").explain()
+        self.assertIn("product_in_stock_idx", plan)
+
+
+class OrderArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="alice", password="test")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", description="", price=i + 1, stocks=5)
+            for i in range(3)
+        )
+        cls.orders = create_orders(cls.user, cls.products, 6)
+        old = timezone.now() - timedelta(days=400)
+        statuses = [
+            Order.StatusChoices.DELIVERED,
+            Order.StatusChoices.CANCELED,
+            Order.StatusChoices.PENDING,
+        ]
+        # the first three are old: delivered, canceled and still pending
+        for order, status in zip(cls.orders[:3], statuses):
+            Order.objects.filter(pk=order.pk).update(created_at=old, status=status)
+        DailyProductSales.objects.rebuild(old.date(), timezone.localdate())
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_orders", "--batch-size=1", *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_finished_orders(self):
+        sales = list(DailyProductSales.objects.values_list("day", "product", "units"))
+        self.client.force_login(self.user)
+        summary = self.client.get(reverse("user_orders", args=[self.user.pk])).json()
+
+        out = self.archive()
+        self.assertIn("Archived 2 orders", out)
+        self.assertIn("app_order:", out)
+        self.assertIn("count:", out)
+
+        delivered, canceled, pending = self.orders[:3]
+        self.assertEqual(
+            set(ArchivedOrder.objects.values_list("pk", flat=True)),
+            {delivered.pk, canceled.pk},
+        )
+        self.assertTrue(Order.objects.filter(pk=pending.pk).exists())
+        self.assertEqual(Order.objects.count(), 4)
+        self.assertFalse(OrderItem.objects.filter(order__in=[delivered, canceled]).exists())
+        archived = ArchivedOrder.objects.get(pk=delivered.pk)
+        self.assertEqual(archived.total_price, delivered.total_price)
+        self.assertEqual(archived.items.count(), 2)
+
+        # the sales and the user's spending don't change, also after a
+        # rebuild of the rollup
+        self.assertCountEqual(
+            DailyProductSales.objects.values_list("day", "product", "units"), sales
+        )
+        DailyProductSales.objects.rebuild(
+            timezone.localdate() - timedelta(days=400), timezone.localdate()
+        )
+        self.assertCountEqual(
+            DailyProductSales.objects.values_list("day", "product", "units"), sales
+        )
+        after = self.client.get(reverse("user_orders", args=[self.user.pk])).json()
+        self.assertEqual(after["summary"], summary["summary"])
+
+    def test_order_detail_falls_back_to_the_archive(self):
+        delivered = self.orders[0]
+        live = self.client.get(reverse("order_detail", args=[delivered.pk])).json()
+        self.archive("--no-vacuum")
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("order_detail", args=[delivered.pk]))
+        self.assertEqual(response.json(), live)
+        missing = self.client.get(reverse("order_detail", args=[uuid.uuid4()]))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_rebuild_sales_rollup_covers_the_archive(self):
+        self.archive("--no-vacuum")
+        archived = set(
+            ArchivedOrder.objects.exclude(status=Order.StatusChoices.CANCELED).values_list(
+                "items__product", "items__quantity"
+            )
+        )
+        # only archived orders left, and an empty rollup
+        Order.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+
+        out = StringIO()
+        call_command("rebuild_sales_rollup", stdout=out)
+        self.assertIn("Rebuilt", out.getvalue())
+        self.assertEqual(
+            set(DailyProductSales.objects.values_list("product", "units")), archived
+        )
+
+    def test_status_and_age_options(self):
+        self.archive("--status=Pending", "--older-than=30", "--no-vacuum")
+        self.assertEqual(
+            list(ArchivedOrder.objects.values_list("pk", flat=True)), [self.orders[2].pk]
+        )
+
+
+class ApiProfileTests(TestCase):
+    # backend/settings_api.py, checked in fresh processes like bench_startup
+    def test_serves_the_api_through_wsgi_and_asgi(self):
+        database = str(connection.settings_dict["NAME"])
+        results = {
+            server: probe("backend.settings_api", server, "/products/", database)
+            for server in ("wsgi", "asgi")
+        }
+        for result in results.values():
+            self.assertEqual(result["status"], 200)
+            self.assertGreater(result["cold_ms"], result["boot_ms"])
+        # the middleware overhead is measured through the WSGI handler
+        self.assertIn("bare_us", results["wsgi"])
+
+    def test_leaves_out_the_admin(self):
+        total, packages = import_times("backend.settings_api")
+        self.assertGreater(total, 0)
+        self.assertIn("django", packages)
+        with mock.patch.dict(os.environ, {"DJANGO_SECRET_KEY": "test"}):
+            lean = import_module("backend.settings_api")
+        self.assertNotIn("django.contrib.admin", lean.INSTALLED_APPS)
+        self.assertFalse(lean.DEBUG)
+        self.assertEqual(lean.SECRET_KEY, "test")
+
+    def test_requires_a_secret_key(self):
+        process = subprocess.run(
+            [sys.executable, "-c", "import backend.settings_api"],
+            env={k: v for k, v in os.environ.items() if k != "DJANGO_SECRET_KEY"},
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn("KeyError: 'DJANGO_SECRET_KEY'", process.stderr)
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.models import Product
+from app.product_cache import invalidate_product
+
+logger = logging.getLogger(__name__)
+
+
+# Product image variants
+# Listings shouldn't make every client download the full size originals.
+# For every Product.image a fixed set of smaller copies
+# (settings.PRODUCT_IMAGE_VARIANTS) is written to products/variants/ and
+# their paths are recorded in Product.image_variants, which
+# ProductSerializer turns into URLs.
+
+# Resizing takes far longer than a request should, so saving a product only
+# schedules the work (app/signals.py) for a small pool of background
+# threads; Pillow releases the GIL while it decodes, resizes and encodes.
+# The generate_product_images management command does the same for
+# existing images, in several processes.
+
+# Every file name contains a hash of its content, so a URL always returns
+# the same bytes and can be cached by browsers and CDNs for a year
+# (see views.product_image).
+
+# Pillow is imported where an image is resized, not at the top: this module
+# is loaded by app/signals.py in every process, and most of them (API
+# workers, management commands) never resize anything.
+
+VARIANTS_DIR = "products/variants"
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix="thumbnails"
+            )
+    return _executor
+
+
+def needs_variants(product):
+    # None for a product without an image, like "source" before the first run
+    return (product.image.name or None) != product.image_variants.get("source")
+
+
+def schedule(product_id):
+    """Makes the variants once the transaction saving the product commits."""
+    if settings.THUMBNAIL_EAGER:
+        transaction.on_commit(lambda: render_variants(product_id))
+    else:
+        transaction.on_commit(lambda: executor().submit(_background_job, product_id))
+
+
+def _background_job(product_id):
+    try:
+        render_variants(product_id)
+    except Exception:
+        logger.exception("Couldn't make the image variants of product %s", product_id)
+    finally:
+        # the worker thread's own connection
+        connections.close_all()
+
+
+def encode(image, spec):
+    from PIL import Image
+
+    variant = image.copy()
+    # keeps the aspect ratio, never makes an image bigger
+    variant.thumbnail(spec["size"], Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    options = {"quality": spec.get("quality", 85)}
+    if spec["format"] == "JPEG":
+        if variant.mode != "RGB":
+            variant = variant.convert("RGB")
+        options.update(optimize=True, progressive=True)
+    elif spec["format"] == "WEBP":
+        if variant.mode not in ("RGB", "RGBA"):
+            variant = variant.convert("RGBA")
+        options.update(method=4)
+
+    buffer = BytesIO()
+    variant.save(buffer, spec["format"], **options)
+    return buffer.getvalue()
+
+
+def render_variants(product_id):
+    """
+    Writes the variants of a product's current image and records them.
+    Returns the new image_variants, or None if the product is gone or
+    its image was replaced meanwhile.
+    """
+    product = Product.objects.filter(pk=product_id).only("image", "image_variants").first()
+    if product is None:
+        return None
+
+    source = product.image.name or None
+    variants = {"source": source} if source else {}
+    if source:
+        from PIL import Image, ImageOps
+
+        specs = settings.PRODUCT_IMAGE_VARIANTS
+        with product.image.open("rb") as file, Image.open(file) as image:
+            # JPEGs can be decoded at 1/2, 1/4 or 1/8 of their size, which
+            # is much faster when only small copies are needed
+            largest = max(max(spec["size"]) for spec in specs.values())
+            image.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(image)
+
+            stem = PurePosixPath(source).stem
+            for name, spec in specs.items():
+                data = encode(image, spec)
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                extension = EXTENSIONS[spec["format"]]
+                path = f"{VARIANTS_DIR}/{stem}-{name}-{digest}.{extension}"
+                if not default_storage.exists(path):
+                    default_storage.save(path, ContentFile(data))
+                variants[name] = path
+
+    # only if the image wasn't replaced in the meantime; update() doesn't
+    # send post_save, so this doesn't schedule another run. updated_at is
+    # product_detail's Last-Modified, the new images must change it
+    unchanged = Q(image=source) if source else Q(image="") | Q(image__isnull=True)
+    updated = Product.objects.filter(unchanged, pk=product_id).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    if not updated:
+        return None
+    invalidate_product(product_id)
+
+    stale = set(product.image_variants.values()) - set(variants.values())
+    for path in stale:
+        if path.startswith(f"{VARIANTS_DIR}/"):
+            default_storage.delete(path)
+    return variants
+
+
+def open_variant(name):
+    """
+    Opens a variant file for FileResponse; raises FileNotFoundError for
+    anything that isn't one.
+    """
+    path = PurePosixPath(name)
+    if path.parent != PurePosixPath(VARIANTS_DIR) or ".." in path.parts:
+        raise FileNotFoundError(name)
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return default_storage.open(str(path), "rb"), content_type
@@ -1,9 +1,41 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
-urlpatterns = [
-    path("products/", views.product_list, name="products"),
-    path("product/<int:pk>/", views.product_detail, name="product_detail"),
-    path("orders/", views.order_list, name="orders"),
+# (route, name, sync view, async view)
+# Routes whose name is listed in settings.ASYNC_API_ROUTES are served by
+# the native async views from app/async_views.py.
+API_ROUTES = [
+    ("products/", "products", views.product_list, async_views.product_list),
+    (
+        "product/<int:pk>/",
+        "product_detail",
+        views.product_detail,
+        async_views.product_detail,
+    ),
+    ("orders/", "orders", views.order_list, async_views.order_list),
 ]
+
+
+def build_urlpatterns(async_routes=()):
+    return [
+        path(route, async_view if name in async_routes else sync_view, name=name)
+        for route, name, sync_view, async_view in API_ROUTES
+    ] + [
+        path("products/search/", views.product_search, name="product_search"),
+        path("users/<int:pk>/orders/", views.user_order_list, name="user_orders"),
+        path("images/<path:name>", views.product_image, name="product_image"),
+        path("reports/sales/", views.sales_report, name="sales_report"),
+        path("orders/bulk/", views.order_bulk_create, name="orders_bulk"),
+        path("orders/export/", views.order_export, name="orders_export"),
+        path("orders/<uuid:order_id>/", views.order_detail, name="order_detail"),
+        path(
+            "product/cache-stats/",
+            views.product_cache_stats,
+            name="product_cache_stats",
+        ),
+    ]
+
+
+urlpatterns = build_urlpatterns(getattr(settings, "ASYNC_API_ROUTES", ()))
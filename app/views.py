@@ -1,9 +1,65 @@
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import api_view
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import (
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
 from rest_framework.response import Response
 
-from app.models import Product,Order,OrderItem
-from app.serializers import ProductSerializer,OrderItemSerializer,OrderSerializer
+from app.archive import find_order
+from app.exports import (
+    CONTENT_TYPES,
+    export_chunks,
+    export_queryset,
+    file_name,
+    gzip_chunks,
+)
+from app.fast_serializers import order_reader, product_reader
+from app.fieldsets import (
+    columns,
+    get_fieldset,
+    load_only,
+    sparse_serializer,
+    trim,
+)
+from app.filters import filter_orders, filter_products
+from app.models import ArchivedOrder, Order, OrderItem, Product, User
+from app.pagination import (
+    OrderPagination,
+    ProductPagination,
+    SearchPagination,
+    query_params,
+)
+from app.product_cache import (
+    cache_stats,
+    format_etag,
+    get_product_entry,
+    invalidate_product,
+)
+from app.reports import build_sales_report
+from app.search import is_available, match_expression, search_words
+from app.serializers import (
+    OrderCreateSerializer,
+    OrderExportFilterSerializer,
+    OrderHistorySerializer,
+    OrderItemSerializer,
+    OrderSerializer,
+    ProductSerializer,
+    SalesReportSerializer,
+    SpendingSummarySerializer,
+)
+from app.streaming import stream_json_array, streaming_response, wants_stream
+from app.thumbnails import open_variant
 
 # from django.http import JsonResponse
 
@@ -17,27 +73,245 @@ from app.serializers import ProductSerializer,OrderItemSerializer,OrderSerialize
 
 @api_view(["GET"])
 def product_list(request):
-    product = Product.objects.all()
-    serializer = ProductSerializer(product, many=True)
-    return Response(serializer.data)
+    # ?fields=id,name / ?exclude=description only return (and only load)
+    # those fields (see app/fieldsets.py)
+    # ?in_stock=true only the products that are available
+    serializer, fieldset = sparse_serializer(request, ProductSerializer)
+    product = filter_products(Product.objects.with_in_stock(), request)
+    product = load_only(product, serializer, fieldset)
+    if wants_stream(request):
+        # ?stream=1 exports the whole catalog without pagination
+        product = product.order_by(*ProductPagination.ordering)
+        return stream_json_array(request, product, product_reader.restricted(fieldset))
+
+    paginator = ProductPagination()
+    serializer.instance = paginator.paginate_queryset(product, request)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(["GET"])
-def product_detail(request, pk):
-    # Step 1: Get the specific product from database
-    product = get_object_or_404(Product, pk=pk)
+def product_search(request):
+    # products/search/?q=coffee mach
+    # ranked full-text search, every word is a prefix (see app/search.py)
+    query = query_params(request).get("q", "")
+    match = match_expression(query)
+    if match is None:
+        raise ValidationError({"q": ["Enter a search term."]})
+    serializer, fieldset = sparse_serializer(request, ProductSerializer)
+
+    if not is_available():
+        # no FTS5 outside SQLite: every word has to be in the name or
+        # the description
+        product = load_only(Product.objects.with_in_stock(), serializer, fieldset)
+        for word in search_words(query):
+            product = product.filter(
+                Q(name__icontains=word) | Q(description__icontains=word)
+            )
+        paginator = ProductPagination()
+        serializer.instance = paginator.paginate_queryset(product, request)
+    else:
+        paginator = SearchPagination()
+        fields = columns(serializer, Product) if fieldset else None
+        serializer.instance = paginator.paginate_search(match, request, fields=fields)
+
+    return paginator.get_paginated_response(serializer.data)
+
 
-    # Step 2: Pass the product object to serializer
-    # This tells serializer: "Convert THIS product to JSON"
-    serializer = ProductSerializer(product)
+@api_view(["GET"])
+def product_detail(request, pk):
+    # Step 1: Get the serialized product, from the cache when possible
+    # (see app/product_cache.py)
+    # The whole product is cached, ?fields= / ?exclude= only trim it
+    fieldset = get_fieldset(request, ProductSerializer())
+    entry = get_product_entry(pk)
 
-    # Step 3: serializer.data converts the product object to dictionary
+    # Step 2: Build the response with the validators of this version
     # Example output: {'id': 1, 'name': 'iPhone', 'price': 999.99}
-    return Response(serializer.data)
+    # The ETag is per format (JSON, MessagePack, ...), and caches must
+    # keep the formats apart: Vary: Accept
+    etag = format_etag(entry, request.accepted_renderer)
+    response = Response(trim(entry["data"], fieldset))
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    patch_vary_headers(response, ["Accept"])
+
+    # Step 3: If the client already has this version (If-None-Match or
+    # If-Modified-Since), answer 304 Not Modified without a body
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=entry["last_modified"],
+        response=response,
+    )
+
+
+@require_GET
+def product_image(request, name):
+    # images/<name> : a product image variant (see app/thumbnails.py)
+    # FileResponse streams the file in blocks instead of reading it into
+    # memory. The file name changes whenever the content does, so the
+    # response can be cached for good.
+    try:
+        file, content_type = open_variant(name)
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise Http404("No such image.")
+    response = FileResponse(file, content_type=content_type)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
 
 
 @api_view(["GET"])
+def product_cache_stats(request):
+    return Response(cache_stats())
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticatedOrReadOnly])
 def order_list(request):
-    orders=Order.objects.all()
-    serializer=OrderSerializer(orders,many=True)
-    return Response(serializer.data)
+    if request.method == "POST":
+        return order_create(request)
+
+    # ?user=, ?status=, ?created_after=, ?created_before=, ?ordering=
+    # ?fields=order_id,items.quantity / ?exclude=items
+    serializer, fieldset = sparse_serializer(request, OrderSerializer)
+    orders, ordering = filter_orders(
+        Order.objects.for_listing(items=item_columns(serializer, fieldset)), request
+    )
+    if wants_stream(request):
+        # ?stream=1 exports every order, items are prefetched per chunk
+        orders = orders.order_by(*ordering)
+        return stream_json_array(request, orders, order_reader.restricted(fieldset))
+
+    paginator = OrderPagination(ordering)
+    # the pagination reads the ordering fields of the last order
+    orders = load_only(orders, serializer, fieldset, extra=paginator.columns())
+    serializer.instance = paginator.paginate_queryset(orders, request)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def item_columns(serializer, fieldset):
+    # the OrderItem fields for Order.objects.for_listing(items=...)
+    items = serializer.child.fields.get("items")
+    if items is None:
+        return False
+    if not fieldset:
+        return None
+    return columns(items, OrderItem)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def user_order_list(request, pk):
+    # users/<id>/orders/ : a user's orders, newest first, with their item
+    # counts (one query per page) and a summary of everything they spent
+    # (one aggregate query), no order is loaded into Python to add it up
+    # Only the user themselves and staff may see them.
+    if request.user.pk == pk:
+        user = request.user
+    elif request.user.is_staff:
+        user = get_object_or_404(User, pk=pk)
+    else:
+        raise PermissionDenied
+    orders = Order.objects.filter(user=user)
+    # the archived orders (see app/archive.py) count too, they are only
+    # left out of the listing
+    summary = combine_summaries(
+        orders.spending_summary(),
+        ArchivedOrder.objects.filter(user=user).spending_summary(),
+    )
+
+    serializer, fieldset = sparse_serializer(request, OrderHistorySerializer)
+    paginator = OrderPagination()
+    page = load_only(
+        orders.with_item_counts(), serializer, fieldset, extra=paginator.columns()
+    )
+    serializer.instance = paginator.paginate_queryset(page, request)
+    data = paginator.get_paginated_data(serializer.data)
+    return Response({"summary": SpendingSummarySerializer(summary).data, **data})
+
+
+def combine_summaries(*summaries):
+    lifetime_value = sum(summary["lifetime_value"] for summary in summaries)
+    order_count = sum(summary["order_count"] for summary in summaries)
+    return {
+        "lifetime_value": lifetime_value,
+        "order_count": order_count,
+        "average_order_value": lifetime_value / order_count if order_count else None,
+    }
+
+
+@api_view(["GET"])
+def order_detail(request, order_id):
+    # orders/<order_id>/ : one order with its items, archived or not
+    try:
+        order = find_order(order_id)
+    except Order.DoesNotExist:
+        raise Http404("No such order.")
+    return Response(OrderSerializer(order).data)
+
+
+def order_create(request):
+    # Reserves the stock and creates the order in one transaction
+    # (see OrderCreateSerializer.create)
+    serializer = OrderCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save(user=request.user)
+
+    # the stock was changed with update(), which doesn't send post_save,
+    # so clear the cached products (see app/product_cache.py) here
+    for line in serializer.validated_data["items"]:
+        invalidate_product(line["product"])
+
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def order_bulk_create(request):
+    # POST orders/bulk/ [{"items": [...]}, {"items": [...]}, ...]
+    # Creates every valid order of the upload in one transaction, with a
+    # handful of queries however many orders there are, and returns a
+    # result for each one (see OrderBulkListSerializer).
+    serializer = OrderCreateSerializer(
+        data=request.data, many=True, max_length=settings.BULK_ORDERS_MAX
+    )
+    serializer.is_valid(raise_exception=True)
+    results = serializer.save(user=request.user)
+
+    for pk in serializer.changed_products:
+        invalidate_product(pk)
+
+    created = sum(result["status"] == "created" for result in results)
+    return Response(
+        {"created": created, "rejected": len(results) - created, "results": results}
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def order_export(request):
+    # orders/export/?output=csv&layout=flat&since=2025-01-01T00:00Z&gzip=1
+    # every order with its items as a download, streamed chunk by chunk
+    # (see app/exports.py)
+    serializer = OrderExportFilterSerializer(data=query_params(request))
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    chunks = export_chunks(
+        export_queryset(params.get("since")), params["output"], params["layout"]
+    )
+    content_type = CONTENT_TYPES[params["output"]]
+    if params["gzip"]:
+        chunks = gzip_chunks(chunks)
+        content_type = "application/gzip"
+    response = streaming_response(request, chunks, content_type)
+    name = file_name(params["output"], params["gzip"])
+    response["Content-Disposition"] = f'attachment; filename="{name}"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def sales_report(request):
+    # reports/sales/?start=2025-01-01&end=2025-12-31 (see app/reports.py)
+    return Response(SalesReportSerializer(build_sales_report(request)).data)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,10 +40,15 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "app",
     "rest_framework",
-    "django_extensions",
 ]
 
+# shell_plus and friends for development, not in requirements.txt
+if find_spec("django_extensions"):
+    INSTALLED_APPS.append("django_extensions")
+
 MIDDLEWARE = [
+    # first, so its timings cover the rest of the stack
+    "app.middleware.RequestInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,6 +58,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request SQL and timing instrumentation (app/middleware.py), adds a
+# Server-Timing header and logs slow requests and likely N+1 queries.
+REQUEST_INSTRUMENTATION = {
+    "ENABLED": False,
+    "SLOW_REQUEST_MS": 500,
+    "N_PLUS_ONE_THRESHOLD": 10,
+}
+
 ROOT_URLCONF = "backend.urls"
 
 TEMPLATES = [
@@ -71,6 +85,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "backend.wsgi.application"
 
+# API routes served by the native async views (app/async_views.py) instead
+# of the sync DRF views, e.g. ["products", "product_detail", "orders"].
+# Only useful when deployed through backend/asgi.py.
+ASYNC_API_ROUTES = []
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -79,9 +98,67 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # keep connections open between requests instead of reopening
+        # (and re-running the pragmas below) for every request
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        # a file instead of the default in-memory test database, so tests
+        # can use several connections at once (and WAL) like production
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Run on every new SQLite connection (app/sqlite.py). Set to {} to use
+# SQLite's defaults.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# LocMemCache is per process. To share cached products between all the
+# worker processes use the file based cache instead:
+# CACHES = {
+#     "default": {
+#         "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+#         "LOCATION": BASE_DIR / "cache",
+#     }
+# }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "backend",
+    }
+}
+
+# product_detail cache (app/product_cache.py)
+PRODUCT_CACHE_ALIAS = "default"
+PRODUCT_CACHE_TIMEOUT = 60 * 60
+PRODUCT_CACHE_VERSION = 2
+
+# the most orders one POST orders/bulk/ may contain
+BULK_ORDERS_MAX = 10_000
+# 10,000 orders are a few MB of JSON, more than Django's 2.5 MB default
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
+# Response formats, picked from the Accept header or ?format= (the first
+# one is the default). See app/renderers.py.
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "app.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "app.renderers.MessagePackRenderer",
+    ],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -119,6 +196,21 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded files (Product.image)
+MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_URL = "media/"
+
+# Resized copies of every product image (app/thumbnails.py), made in a
+# pool of THUMBNAIL_WORKERS background threads after the product is saved.
+# THUMBNAIL_EAGER makes them right away instead (tests).
+PRODUCT_IMAGE_VARIANTS = {
+    "thumbnail": {"size": (200, 200), "format": "JPEG", "quality": 80},
+    "medium": {"size": (800, 800), "format": "JPEG", "quality": 85},
+    "webp": {"size": (800, 800), "format": "WEBP", "quality": 80},
+}
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_EAGER = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
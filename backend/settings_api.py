@@ -0,0 +1,60 @@
+"""
+Production settings for the API workers.
+
+    DJANGO_SETTINGS_MODULE=backend.settings_api DJANGO_SECRET_KEY=... gunicorn backend.wsgi
+
+Everything from backend/settings.py, minus what a JSON API never uses:
+the admin, sessions, messages, static files, templates, the browsable API
+and the middleware behind them. Fewer apps means less to import and set
+up when a worker boots, fewer middleware means less work on every request.
+Compare both profiles with `python manage.py bench_startup`.
+
+Clients authenticate with HTTP Basic; session login only exists in the
+full profile (backend/settings.py), which is also where the admin runs.
+"""
+
+import os
+
+from backend.settings import *  # noqa: F401,F403
+from backend.settings import REST_FRAMEWORK
+
+# never the development key from backend/settings.py, a worker without
+# DJANGO_SECRET_KEY doesn't start (KeyError)
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "localhost").split(",")
+
+# auth and contenttypes stay: app.User is a contrib.auth user
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "app",
+    "rest_framework",
+]
+
+MIDDLEWARE = [
+    # costs nothing while REQUEST_INSTRUMENTATION["ENABLED"] is False, it
+    # removes itself from the stack (MiddlewareNotUsed)
+    "app.middleware.RequestInstrumentationMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+# no HTML: Django's error pages fall back to their built-in text
+TEMPLATES = []
+
+# English only, the translation machinery isn't loaded
+USE_I18N = False
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": [
+        "app.renderers.FastJSONRenderer",
+        "app.renderers.MessagePackRenderer",
+    ],
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+}